@@ -0,0 +1,125 @@
+###########################################################################################
+#                                                                                         #
+# Fill a database with a synthetic Pomodoro history for benchmarking.                     #
+#                                                                                         #
+#   python benchmarks/generate_history.py --rows 1000000 --activities 2000 history.db     #
+#                                                                                         #
+# Sessions follow working days: 8 to 16 sessions per day, 5 to 60 minutes each, with      #
+# short breaks. Activity use is skewed, a few names account for most sessions.            #
+#                                                                                         #
+###########################################################################################
+
+
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pomodoro_engine import ActivityDatabase, SESSION_MISSING, SESSION_STARTED, SESSION_STATUSES
+
+
+WORDS = [
+    "report", "review", "email", "meeting", "design", "refactor", "planning", "research",
+    "support", "testing", "writing", "reading", "budget", "release", "backlog", "interview",
+]
+
+# How a session ends: finished, cancelled, already closed as missing, or still
+# open (left for check_and_fix_records to repair)
+DEFAULT_MIX = {"finished": 0.70, "cancelled": 0.20, "missing": 0.04, "unended": 0.06}
+
+
+def activity_names(count, rng):
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.randint(1, 999)}")
+    return sorted(names)
+
+def day_counts(rows, rng):
+    # Sessions of each working day, adding up to rows
+    counts = []
+    while rows > 0:
+        counts.append(min(rng.randint(8, 16), rows))
+        rows -= counts[-1]
+    return counts
+
+def generate_rows(counts, activity_ids, mix, start, rng):
+    # Yield sessions tuples (activity_id, start_ts, end_ts, status), counts[i]
+    # of them on the i-th day from start
+    weights  = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(activity_ids))))
+    outcomes = list(mix)
+    odds     = [mix[outcome] for outcome in outcomes]
+    for offset, count in enumerate(counts):
+        day = start + datetime.timedelta(days=offset)
+        now = datetime.datetime.combine(day, datetime.time(8, 0)) + datetime.timedelta(minutes=rng.randint(0, 90))
+        for _ in range(count):
+            activity_id = rng.choices(activity_ids, cum_weights=weights)[0]
+            start_ts    = int(now.timestamp())
+            now        += datetime.timedelta(minutes=rng.randint(5, 60), seconds=rng.randint(0, 59))
+            outcome     = rng.choices(outcomes, odds)[0]
+
+            if outcome == "unended":
+                yield (activity_id, start_ts, None, SESSION_STARTED)
+            elif outcome == "missing":
+                yield (activity_id, start_ts, start_ts, SESSION_MISSING)
+            else:
+                yield (activity_id, start_ts, int(now.timestamp()), SESSION_STATUSES.index(outcome))
+            now += datetime.timedelta(minutes=rng.randint(1, 20))
+
+def generate(db_name, rows, activities, mix=DEFAULT_MIX, seed=0, chunk_size=50000):
+    rng    = random.Random(seed)
+    names  = activity_names(activities, rng)
+    counts = day_counts(rows, rng)
+
+    # The last day is today, or the day before the oldest session of a
+    # database being extended, so the history stops short of next week
+    # and does not overlap what is there
+    db     = ActivityDatabase(db_name)
+    oldest = db.conn.execute('SELECT MIN(start_ts) FROM sessions').fetchone()[0]
+    last   = datetime.date.today()
+    if oldest is not None:
+        last = min(last, datetime.date.fromtimestamp(oldest) - datetime.timedelta(days=1))
+    start  = last - datetime.timedelta(days=len(counts) - 1)
+
+    db.conn.execute('PRAGMA synchronous=OFF')
+    with db.conn:
+        db.conn.executemany('INSERT OR IGNORE INTO activities (name) VALUES (?)', [(name,) for name in names])
+    ids          = dict(db.conn.execute('SELECT name, id FROM activities').fetchall())
+    activity_ids = [ids[name] for name in names]
+
+    chunk = []
+    for row in generate_rows(counts, activity_ids, mix, start, rng):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            with db.conn:
+                db.conn.executemany('INSERT INTO sessions (activity_id, start_ts, end_ts, status) VALUES (?, ?, ?, ?)', chunk)
+            chunk = []
+    with db.conn:
+        db.conn.executemany('INSERT INTO sessions (activity_id, start_ts, end_ts, status) VALUES (?, ?, ?, ?)', chunk)
+
+    db.backfill_rollups()
+    db.conn.execute('ANALYZE')
+    db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Pomodoro history")
+    parser.add_argument("db", help="database file to create or extend")
+    parser.add_argument("--rows",       type=int, default=100000, help="sessions to add (default: 100000)")
+    parser.add_argument("--activities", type=int, default=1000,   help="distinct activity names (default: 1000)")
+    parser.add_argument("--seed",       type=int, default=0,      help="random seed (default: 0)")
+    for outcome, share in DEFAULT_MIX.items():
+        parser.add_argument(f"--{outcome}", type=float, default=share, help=f"share of sessions ending {outcome} (default: {share})")
+    args = parser.parse_args(argv)
+
+    mix   = {outcome: getattr(args, outcome) for outcome in DEFAULT_MIX}
+    start = time.perf_counter()
+    generate(args.db, args.rows, args.activities, mix, args.seed)
+    print(f"Generated {args.rows} sessions in {time.perf_counter() - start:.1f} s: {args.db}")
+
+if __name__ == "__main__":
+    main()
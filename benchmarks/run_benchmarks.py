@@ -0,0 +1,167 @@
+###########################################################################################
+#                                                                                         #
+# Time the hot paths of the Pomodoro timer against a large database and write the         #
+# results as JSON, so runs from different versions can be compared.                       #
+#                                                                                         #
+#   python benchmarks/run_benchmarks.py --rows 1000000 --output results.json              #
+#                                                                                         #
+# The database is generated with generate_history.py when it does not exist yet.          #
+# The summary table benchmarks need a display and are reported as skipped without one.    #
+#                                                                                         #
+###########################################################################################
+
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from pomodoro_engine import ActivityDatabase, SummaryModel
+from generate_history import generate
+
+
+def measure(func, repeat):
+    # Run func `repeat` times and return timing statistics in milliseconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs":      repeat,
+        "min_ms":    min(timings),
+        "median_ms": statistics.median(timings),
+        "max_ms":    max(timings),
+    }
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def bench_open(db_name, repeat):
+    def open_db():
+        ActivityDatabase(db_name).close()
+    return measure(open_db, repeat)
+
+def bench_check_and_fix(db, repeat):
+    # The first run closes the generated open sessions, later runs find none
+    return {
+        "check_and_fix_records_first": measure(db.check_and_fix_records, 1),
+        "check_and_fix_records":       measure(db.check_and_fix_records, repeat),
+    }
+
+def bench_summary(db, repeat):
+    last    = datetime.date.fromisoformat(db.conn.execute('SELECT MAX(day) FROM daily_totals').fetchone()[0])
+    results = {}
+    for name, days in [("day", 1), ("week", 7), ("month", 31), ("year", 365)]:
+        first = last - datetime.timedelta(days=days - 1)
+        results[f"summary_{name}"] = measure(lambda: db.summary(first, last), repeat)
+    return results
+
+def bench_search(db, repeat):
+    results = {"activity_index_load": measure(lambda: db.activity_index.load(db.cursor), repeat)}
+    queries = ["r", "re", "rep", "repo", "report", "report 1", "xyz"]
+
+    # Cold: every query starts from an empty cache, as after an index rebuild
+    def cold():
+        for query in queries:
+            db.activity_index.cache = {}
+            db.search_activities(query, 50)
+
+    # Typing: one keystroke after the other, each narrowing the previous result
+    def typing():
+        db.activity_index.cache = {}
+        for query in queries[:-1]:
+            db.search_activities(query, 50)
+
+    results["search_activities_cold"]   = measure(cold, repeat)
+    results["search_activities_typing"] = measure(typing, repeat)
+    return results
+
+def bench_sort_by(db, repeat, rows):
+    db.cursor.execute('''
+        SELECT activities.name, seconds, first_start, last_end
+        FROM daily_totals JOIN activities ON activities.id = daily_totals.activity_id
+        LIMIT ?
+    ''', (rows,))
+    model   = SummaryModel(db.cursor.fetchall())
+    results = {
+        "summary_model_rows":          len(model),
+        "summary_model_sort_activity": measure(lambda: model.sort("Activity"),        repeat),
+        "summary_model_sort_duration": measure(lambda: model.sort("Cumulative Time"), repeat),
+    }
+
+    try:
+        import tkinter as tk
+        from pomodoro import SummaryTable
+        root = tk.Tk()
+    except Exception as e:
+        results["sort_by"] = {"skipped": str(e)}
+        return results
+
+    # Only the summary table is needed, not the full window
+    table = SummaryTable(root, model)
+    table.pack(expand=True, fill="both")
+    root.update()
+    results["sort_by_activity"] = measure(lambda: (table.sort_by("Activity"),        root.update()), repeat)
+    results["sort_by_duration"] = measure(lambda: (table.sort_by("Cumulative Time"), root.update()), repeat)
+    results["scroll_page"]      = measure(lambda: (table.on_scrollbar("scroll", 1, "pages"), root.update()), repeat)
+    root.destroy()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Pomodoro timer on a large history")
+    parser.add_argument("--db",         default=None, help="database to benchmark (default: benchmarks/history-<rows>.db)")
+    parser.add_argument("--rows",       type=int, default=100000, help="sessions when generating (default: 100000)")
+    parser.add_argument("--activities", type=int, default=1000,   help="activities when generating (default: 1000)")
+    parser.add_argument("--repeat",     type=int, default=5,      help="runs per benchmark (default: 5)")
+    parser.add_argument("--tree-rows",  type=int, default=5000,   help="rows in the summary table (default: 5000)")
+    parser.add_argument("--output",     default=None, help="JSON file for the results (default: stdout)")
+    args = parser.parse_args(argv)
+
+    db_name = args.db or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"history-{args.rows}.db")
+    if not os.path.exists(db_name):
+        generate(db_name, args.rows, args.activities)
+
+    results = {"db_open": bench_open(db_name, args.repeat)}
+    db      = ActivityDatabase(db_name)
+    results.update(bench_check_and_fix(db, args.repeat))
+    results.update(bench_summary(db, args.repeat))
+    results.update(bench_search(db, args.repeat))
+    results.update(bench_sort_by(db, args.repeat, args.tree_rows))
+
+    report = {
+        "version":    git_version(),
+        "date":       datetime.datetime.now().isoformat(timespec="seconds"),
+        "python":     platform.python_version(),
+        "sqlite":     sqlite3.sqlite_version,
+        "db":         os.path.basename(db_name),
+        "db_bytes":   os.path.getsize(db_name),
+        "sessions":   db.conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0],
+        "activities": db.conn.execute('SELECT COUNT(*) FROM activities').fetchone()[0],
+        "results":    results,
+    }
+    db.close()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
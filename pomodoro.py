@@ -18,21 +18,28 @@
 
 
 import tkinter as tk
-from tkinter import messagebox, ttk
-import sqlite3
+from tkinter import filedialog, messagebox, simpledialog, ttk
+import collections
 import datetime
-import logging
-import re
+import math
 import os
+import queue
+import sys
+import threading
+
+from pomodoro_engine import (
+    ActivityDatabase, PeriodSummaryModel, QueryWorker, SummaryModel, TimerDriver, TimerScheduler,
+    format_duration, parse_date_range, seconds_until, summary_steps
+)
+from pomodoro_analytics import BIN_SECONDS, WEEKDAYS, Analytics, require_numpy
+from pomodoro_export import export_sessions
+from pomodoro_intervals import period_rows, period_summary_steps, running_sessions
+from pomodoro_logs import configure_logging
+import pomodoro_metrics as metrics
 
 
 # Configure logging
-logging.basicConfig(
-    filename='pomodoro.csv',
-    level=logging.INFO,
-    format='%(asctime)s, %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+configure_logging()
 
 class Tooltip:
     def __init__(self, widget, text):
@@ -69,23 +76,639 @@ class Row:
         self.row = self.initial_row
 
 
+class Toast:
+    # One borderless notification window; a click dismisses it
+    def __init__(self, notifier, title, message, repeats, sticky):
+        self.notifier = notifier
+        self.title    = title
+        self.repeats  = repeats
+        self.sticky   = sticky
+        self.after_id = None
+
+        self.window = tk.Toplevel(notifier.master)
+        self.window.wm_overrideredirect(True)
+        self.window.attributes("-topmost", True)
+        frame = tk.Frame(self.window, background="lightyellow", relief="solid", borderwidth=1)
+        frame.pack()
+        title_label = tk.Label(frame, text=title, background="lightyellow", font=("TkDefaultFont", 10, "bold"))
+        title_label.pack(anchor=tk.W, padx=10, pady=(6, 0))
+        self.label = tk.Label(frame, text=self.text(message), background="lightyellow", justify=tk.LEFT, wraplength=260)
+        self.label.pack(anchor=tk.W, padx=10, pady=(0, 6))
+        for widget in (frame, title_label, self.label):
+            widget.bind("<Button-1>", lambda event: self.notifier.dismiss(self))
+        self.schedule_close()
+
+    def text(self, message):
+        return message + (f"  (x{self.repeats})" if self.repeats > 1 else "")
+
+    def update(self, message, sticky):
+        self.repeats += 1
+        self.sticky   = self.sticky or sticky
+        self.label.config(text=self.text(message))
+        self.schedule_close()
+
+    def schedule_close(self):
+        if self.after_id:
+            self.window.after_cancel(self.after_id)
+            self.after_id = None
+        if not self.sticky:
+            self.after_id = self.window.after(self.notifier.duration_ms, lambda: self.notifier.dismiss(self))
+
+class Notifier:
+    # Non-modal toasts stacked in the bottom right corner of the screen.
+    # notify() only queues and returns; toasts are shown from the event loop,
+    # so a reminder never holds up a countdown tick or a database write. A
+    # notification whose title is already queued or on screen is merged into
+    # it, so a burst shows one toast with a count and rings the bell once.
+    def __init__(self, master, duration_ms=8000, max_visible=3):
+        self.master           = master
+        self.bell             = True
+        self.duration_ms      = duration_ms
+        self.max_visible      = max_visible
+        self.pending          = collections.deque()  # [title, message, repeats, sticky]
+        self.toasts           = []                   # On screen, oldest first
+        self.process_after_id = None
+
+    def notify(self, title, message, sticky=False):
+        # sticky toasts stay until clicked
+        for toast in self.toasts:
+            if toast.title == title:
+                toast.update(message, sticky)
+                return
+        for item in self.pending:
+            if item[0] == title:
+                item[1]  = message
+                item[2] += 1
+                item[3]  = item[3] or sticky
+                return
+
+        self.pending.append([title, message, 1, sticky])
+        if self.process_after_id is None:
+            self.process_after_id = self.master.after_idle(self.process)
+
+    def process(self):
+        self.process_after_id = None
+        shown = False
+        while self.pending and len(self.toasts) < self.max_visible:
+            self.toasts.append(Toast(self, *self.pending.popleft()))
+            shown = True
+        if shown:
+            if self.bell:
+                self.master.bell()
+            self.place()
+
+    def dismiss(self, toast):
+        if toast in self.toasts:
+            self.toasts.remove(toast)
+            toast.window.destroy()
+            self.place()
+            self.process()
+
+    def place(self):
+        # Newest at the bottom, older ones above it
+        y = self.master.winfo_screenheight() - 60
+        for toast in reversed(self.toasts):
+            toast.window.update_idletasks()
+            width  = toast.window.winfo_reqwidth()
+            height = toast.window.winfo_reqheight()
+            y     -= height + 10
+            toast.window.wm_geometry(f"+{self.master.winfo_screenwidth() - width - 20}+{y}")
+
+
+class SummaryTable:
+    # Treeview showing a window onto a SummaryModel. Only the visible rows exist
+    # as items; scrolling and sorting rewrite their values in place, so the cost
+    # does not depend on how many rows the model holds.
+    def __init__(self, parent, model, visible_rows=20):
+        self.model           = model
+        self.offset          = 0
+        self.items           = []
+        self.sort_column     = None
+        self.sort_descending = False
+
+        self.frame = ttk.Frame(parent)
+        self.tree  = ttk.Treeview(self.frame, columns=model.COLUMNS, show="headings", height=visible_rows)
+        for column in model.COLUMNS:
+            self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.tree.pack(side=tk.LEFT, expand=True, fill="both")
+
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>",   lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>",   lambda event: self.scroll(3))
+        self.tree.bind("<Configure>",  self.on_resize)
+        self.set_visible_rows(visible_rows)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_visible_rows(self, count):
+        count = max(count, 1)
+        while len(self.items) < count:
+            self.items.append(self.tree.insert("", "end"))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        self.refresh()
+
+    def refresh(self):
+        total       = len(self.model)
+        visible     = len(self.items)
+        self.offset = max(0, min(self.offset, total - visible))
+        for i, item in enumerate(self.items):
+            index = self.offset + i
+            self.tree.item(item, values=self.model.values(index) if index < total else ())
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(self.offset + visible, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.model))
+            self.refresh()
+        else:
+            self.scroll(int(amount) * (len(self.items) if unit == "pages" else 1))
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        # Show as many rows as fit once the window is resized
+        bbox = self.tree.bbox(self.items[0])
+        if bbox:
+            rows = (event.height - bbox[1]) // bbox[3]
+            if rows != len(self.items):
+                self.set_visible_rows(rows)
+
+    def sort_by(self, column):
+        # The first click on a column sorts descending, the next one ascending
+        descending           = not (column == self.sort_column and self.sort_descending)
+        self.sort_column     = column
+        self.sort_descending = descending
+
+        # Change the sort indicator
+        for col in self.model.COLUMNS:
+            self.tree.heading(col, text=col)
+        self.tree.heading(column, text=column + (" ▼" if descending else " ▲"))
+
+        self.model.sort(column, descending)
+        self.offset = 0
+        self.refresh()
+
+    def rows_added(self):
+        # Keep the current order once more rows arrived in the model
+        if self.sort_column:
+            self.model.sort(self.sort_column, self.sort_descending)
+        self.refresh()
+
+
+class BackgroundQuery:
+    # Hands the steps of a QueryWorker to callbacks on the Tk thread, polling
+    # its queue with after(). A poll handles at most max_steps, so results
+    # arriving fast never hold up the timer's wake-up. on_done gets None, or
+    # the exception that stopped the worker.
+    def __init__(self, widget, worker, on_step, on_done, poll_ms=50, max_steps=5):
+        self.widget    = widget
+        self.worker    = worker
+        self.on_step   = on_step
+        self.on_done   = on_done
+        self.poll_ms   = poll_ms
+        self.max_steps = max_steps
+        self.worker.start()
+        self.after_id  = widget.after(poll_ms, self.poll)
+
+    def poll(self):
+        self.after_id = None
+        for _ in range(self.max_steps):
+            try:
+                step = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if step is QueryWorker.DONE or isinstance(step, Exception):
+                self.on_done(None if step is QueryWorker.DONE else step)
+                return
+            self.on_step(*step)
+        self.after_id = self.widget.after(self.poll_ms, self.poll)
+
+    def cancel(self):
+        self.worker.cancel()
+        if self.after_id:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+
+class SummaryWindow:
+    # Time per activity over a date range, as a whole ("Range", from the daily
+    # rollup) or per week, day or hour (clipped from the sessions). Queries
+    # run on a QueryWorker and rows stream into the table as they arrive.
+    GROUPS = ("Range", "Week", "Day", "Hour")
+
+    def __init__(self, parent, db, first_day, last_day):
+        self.db        = db
+        self.first_day = first_day
+        self.last_day  = last_day
+        self.table     = None
+        self.query     = None
+        self.window    = tk.Toplevel(parent)
+        self.window.title("Activity Summary")
+
+        top = ttk.Frame(self.window)
+        top.pack(fill="x", padx=5, pady=5)
+        ttk.Label(top, text="Group by:").pack(side=tk.LEFT)
+        self.group_choice = ttk.Combobox(top, values=self.GROUPS, state="readonly", width=8)
+        self.group_choice.set(self.GROUPS[0])
+        self.group_choice.bind("<<ComboboxSelected>>", self.load)
+        self.group_choice.pack(side=tk.LEFT, padx=(5, 0))
+        self.progress = ttk.Progressbar(top, length=120, maximum=1.0)
+        self.progress.pack(side=tk.LEFT, padx=(10, 0))
+        self.cancel_button = ttk.Button(top, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        self.status_label = ttk.Label(top)
+        self.status_label.pack(side=tk.LEFT, padx=(5, 0))
+
+        self.window.bind("<Destroy>", self.on_destroy)
+        self.load()
+
+    def load(self, event=None):
+        self.cancel()
+        group = self.group_choice.get()
+        if group == "Range":
+            model       = SummaryModel()
+            sort_column = "Start Time"
+            steps       = lambda conn: summary_steps(conn, self.first_day, self.last_day)
+            self.rows   = lambda rows: rows
+        else:
+            # The running timers are read here: the meta table belongs to this thread's connection
+            running     = running_sessions(self.db)
+            model       = PeriodSummaryModel()
+            sort_column = "Period"
+            steps       = lambda conn: period_summary_steps(self.db, conn, self.first_day, self.last_day, group.lower(), running)
+            self.rows   = period_rows
+
+        if self.table:
+            self.table.frame.destroy()
+        self.table = SummaryTable(self.window, model)
+        metrics.instrument(self.table, "gui.summary", ("sort_by", "refresh", "rows_added"))
+        self.table.sort_by(sort_column)
+        self.table.pack(expand=True, fill="both")
+
+        # Include sessions that are still queued for writing
+        self.db.flush(timeout=2)
+        self.progress.config(mode="determinate", value=0)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Loading...")
+        self.query = BackgroundQuery(self.window, QueryWorker(self.db, steps), self.add_rows, self.finished)
+
+    def add_rows(self, progress, rows):
+        if progress is None:
+            if str(self.progress.cget("mode")) != "indeterminate":
+                self.progress.config(mode="indeterminate")
+                self.progress.start(20)
+        else:
+            self.progress.config(value=progress)
+        if rows:
+            self.table.model.add_rows(self.rows(rows))
+            self.table.rows_added()
+
+    def finished(self, error):
+        self.query = None
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0 if error else 1.0)
+        self.cancel_button.config(state=tk.DISABLED)
+        if error:
+            self.status_label.config(text="Failed")
+            messagebox.showerror("Summary", str(error), parent=self.window)
+        else:
+            self.status_label.config(text=f"{len(self.table.model)} rows")
+
+    def cancel(self):
+        if self.query:
+            self.query.cancel()
+            self.query = None
+            self.progress.stop()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Cancelled")
+
+    def on_destroy(self, event):
+        # <Destroy> also arrives for every child widget
+        if event.widget is self.window:
+            self.cancel()
+
+
+class AnalyticsWindow:
+    # Heatmap, streaks, completion rates and session lengths for a date range.
+    # Reports are cached by Analytics, so going back to a range is instant;
+    # others are computed on a QueryWorker.
+    RANGES     = ("All time", "Last 365 days", "Last 90 days", "Last 30 days", "Summary range")
+    CELL       = (26, 22)
+    HEAT_COLOR = (220, 60, 40)
+
+    def __init__(self, parent, analytics, summary_range):
+        self.analytics     = analytics
+        self.summary_range = summary_range
+        self.query         = None
+        self.window        = tk.Toplevel(parent)
+        self.window.title("Analytics")
+        self.window.bind("<Destroy>", self.on_destroy)
+
+        top = ttk.Frame(self.window)
+        top.pack(fill="x", padx=10, pady=10)
+        self.range_choice = ttk.Combobox(top, values=self.RANGES, state="readonly", width=15)
+        self.range_choice.set(self.RANGES[0])
+        self.range_choice.bind("<<ComboboxSelected>>", self.refresh)
+        self.range_choice.pack(side=tk.LEFT)
+        self.totals_label = ttk.Label(top)
+        self.totals_label.pack(side=tk.LEFT, padx=(10, 0))
+
+        notebook   = ttk.Notebook(self.window)
+        width      = 40 + 24 * self.CELL[0]
+        self.heatmap = tk.Canvas(notebook, width=width, height=20 + 7 * self.CELL[1], background="white")
+        notebook.add(self.heatmap, text="Hour of day")
+
+        columns         = ("Activity", "Finished", "Cancelled", "Missing", "Completion", "Time")
+        activity_frame  = ttk.Frame(notebook)
+        self.activities = ttk.Treeview(activity_frame, columns=columns, show="headings", height=10)
+        for column in columns:
+            self.activities.heading(column, text=column)
+            self.activities.column(column, width=200 if column == "Activity" else 80, anchor=tk.W if column == "Activity" else tk.E)
+        scrollbar = ttk.Scrollbar(activity_frame, orient=tk.VERTICAL, command=self.activities.yview)
+        self.activities.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.activities.pack(side=tk.LEFT, expand=True, fill="both")
+        notebook.add(activity_frame, text="Activities")
+
+        length_frame       = ttk.Frame(notebook)
+        self.lengths       = tk.Canvas(length_frame, width=width, height=150, background="white")
+        self.lengths.pack()
+        self.lengths_label = ttk.Label(length_frame)
+        self.lengths_label.pack(pady=5)
+        notebook.add(length_frame, text="Session lengths")
+
+        notebook.pack(expand=True, fill="both", padx=10, pady=(0, 10))
+        self.refresh()
+
+    def date_range(self):
+        choice = self.range_choice.get()
+        if choice == "All time":
+            return None, None
+        if choice == "Summary range":
+            return self.summary_range
+        today = datetime.date.today()
+        return today - datetime.timedelta(days=int(choice.split()[1]) - 1), today
+
+    def refresh(self, event=None):
+        if self.query:
+            self.query.cancel()
+            self.query = None
+        first_day, last_day = self.date_range()
+        report = self.analytics.cached(first_day, last_day)
+        if report is not None:
+            self.show(report)
+            return
+
+        def steps(conn):
+            yield 1.0, self.analytics.compute(conn, first_day, last_day)
+        self.totals_label.config(text="Computing...")
+        self.query = BackgroundQuery(
+            self.window, QueryWorker(self.analytics.db, steps), lambda progress, report: self.show(report), self.finished
+        )
+
+    def finished(self, error):
+        self.query = None
+        if error:
+            self.totals_label.config(text="")
+            messagebox.showerror("Analytics", str(error), parent=self.window)
+
+    def on_destroy(self, event):
+        if event.widget is self.window and self.query:
+            self.query.cancel()
+
+    def show(self, report):
+        streaks = report["streaks"]
+        text    = f"{report['sessions']} sessions, {format_duration(report['seconds'])} worked. Longest streak: {streaks['longest']} days"
+        if streaks["longest"]:
+            text += f" ({streaks['longest_from']} to {streaks['longest_to']})"
+        self.totals_label.config(text=text + f", current: {streaks['current']} days")
+
+        self.draw_heatmap(report["heatmap"])
+        self.activities.delete(*self.activities.get_children())
+        for name, finished, cancelled, missing, seconds in report["activities"]:
+            ended = finished + cancelled + missing
+            self.activities.insert("", "end", values=(
+                name, finished, cancelled, missing, f"{100 * finished // ended}%" if ended else "", format_duration(seconds)
+            ))
+        self.draw_lengths(report["length_bins"], report["percentiles"])
+
+    def heat_color(self, fraction):
+        return "#" + "".join(f"{round(255 - (255 - c) * fraction):02x}" for c in self.HEAT_COLOR)
+
+    def draw_heatmap(self, heatmap):
+        canvas = self.heatmap
+        canvas.delete("all")
+        width, height = self.CELL
+        most = max(max(row) for row in heatmap) or 1
+        for hour in range(0, 24, 3):
+            canvas.create_text(40 + hour * width + width // 2, 10, text=f"{hour:02d}")
+        for day, row in enumerate(heatmap):
+            y = 20 + day * height
+            canvas.create_text(20, y + height // 2, text=WEEKDAYS[day])
+            for hour, seconds in enumerate(row):
+                x = 40 + hour * width
+                canvas.create_rectangle(x, y, x + width, y + height, fill=self.heat_color(seconds / most), outline="white")
+
+    def draw_lengths(self, bins, percentiles):
+        canvas = self.lengths
+        canvas.delete("all")
+        width = self.CELL[0]
+        most  = max(bins) or 1
+        for i, count in enumerate(bins):
+            x = 40 + i * width
+            canvas.create_rectangle(x + 2, 130 - 110 * count / most, x + width - 2, 130, fill=self.heat_color(1), outline="")
+            if i % 4 == 0:
+                canvas.create_text(x, 140, text=str(i * BIN_SECONDS // 60))
+        canvas.create_text(40 + len(bins) * width, 140, text="min")
+
+        if percentiles:
+            self.lengths_label.config(text="Finished sessions: " + ", ".join(
+                f"{'median' if p == 50 else f'{p}%'} {seconds // 60} min" for p, seconds in percentiles.items()
+            ))
+        else:
+            self.lengths_label.config(text="No finished sessions")
+
+
+class MetricsPanel:
+    # Live view of pomodoro_metrics, refreshed every second while open
+    COLUMNS = ("Metric", "Count", "Mean ms", "p50 ms", "p95 ms", "Max ms")
+
+    def __init__(self, parent, db):
+        self.db     = db
+        self.window = tk.Toplevel(parent)
+        self.window.title("Metrics")
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, show="headings", height=16)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=200 if column == "Metric" else 80, anchor=tk.W if column == "Metric" else tk.E)
+        self.tree.pack(expand=True, fill="both", padx=10, pady=10)
+        self.writer_label = ttk.Label(self.window)
+        self.writer_label.pack(padx=10, anchor=tk.W)
+
+        buttons = ttk.Frame(self.window)
+        buttons.pack(fill="x", padx=10, pady=10)
+        ttk.Button(buttons, text="Reset", command=metrics.reset).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Save JSON...", command=self.save).pack(side=tk.RIGHT)
+        self.refresh()
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+
+        snapshot = metrics.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for name, histogram in snapshot["histograms"].items():
+            self.tree.insert("", "end", values=(name, histogram["count"]) + tuple(
+                f"{histogram[key]:.2f}" for key in ("mean_ms", "p50_ms", "p95_ms", "max_ms")
+            ))
+        for name, value in snapshot["counters"].items():
+            self.tree.insert("", "end", values=(name, value))
+
+        if self.db.writer:
+            stats = self.db.writer.stats()
+            self.writer_label.config(text=f"Writer queue: {stats['queue_depth']}, commits: {stats['flush_count']}, errors: {stats['error_count']}, busy retries: {stats['busy_count']}")
+        self.window.after(1000, self.refresh)
+
+    def save(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.window,
+            title="Save metrics",
+            initialfile="pomodoro_metrics.json",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")]
+        )
+        if path:
+            metrics.dump(path)
+
+
+class TimersWindow:
+    # Every running timer, redrawn once a second while open. Double-click or
+    # Show puts one in the main window.
+    COLUMNS = ("Activity", "Left", "Ends at")
+
+    def __init__(self, app):
+        self.app    = app
+        self.window = tk.Toplevel(app.master)
+        self.window.title("Timers")
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, show="headings", height=8, selectmode="browse")
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=200 if column == "Activity" else 80, anchor=tk.W if column == "Activity" else tk.E)
+        self.tree.pack(expand=True, fill="both", padx=10, pady=10)
+        self.tree.bind("<Double-1>", self.on_show)
+
+        buttons = ttk.Frame(self.window)
+        buttons.pack(fill="x", padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Show", command=self.on_show).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Stop", command=self.on_stop).pack(side=tk.RIGHT)
+        self.tick()
+
+    def tick(self):
+        if self.window.winfo_exists():
+            self.fill()
+            self.window.after(1000, self.tick)
+
+    def fill(self):
+        selected = self.tree.selection()
+        self.tree.delete(*self.tree.get_children())
+        for engine in self.app.scheduler.running:
+            self.tree.insert("", "end", iid=str(engine.timer_id), values=(
+                engine.activity or "(no activity)",
+                format_duration(max(math.ceil(engine.remaining()), 0)),
+                f"{engine.ends_at:%H:%M:%S}"
+            ))
+        self.tree.selection_set([item for item in selected if self.tree.exists(item)])
+
+    def selected(self):
+        selection = self.tree.selection()
+        return self.app.scheduler.timers.get(int(selection[0])) if selection else None
+
+    def on_show(self, event=None):
+        engine = self.selected()
+        if engine:
+            self.app.focus_timer(engine)
+
+    def on_stop(self):
+        engine = self.selected()
+        if engine:
+            self.app.stop_timer(engine)
+            self.fill()
+
+
 class PomodoroTimer:
     def __init__(self, master):
         self.master              = master
         self.master.title("Pomodoro Timer")
-        self.master.geometry("320x400")  # Adjusted to accommodate activity input
+        self.master.geometry("320x430")  # Adjusted to accommodate activity input
         self.has_encourted_error = False
         self.timer_type          = tk.StringVar(value="duration")
-        self.timer_started       = False
-        self.remaining_time      = 0
+        self.cycle_mode          = tk.BooleanVar(value=False)
         self.status              = tk.StringVar(value="initial")
         self.activity_name       = tk.StringVar()
         self.db_name             = 'activities.db'
-
+        self.db                  = None
+        self.scheduler           = None
+        self.driver              = None  # Wake-up loop of the timers, on master.after()
+        self.engine              = None  # The timer shown in the main window
+        self.analytics           = None
+        self.suggest_after_id    = None
+        self.suggest_delay_ms    = 120  # Debounce for keystroke bursts
+        self.suggest_limit       = 50
+        self.notify_bell         = tk.BooleanVar(value=True)
+        self.notifier            = Notifier(master)
+
+        # Handlers are wrapped before the widgets bind them; a no-op unless metrics are on
+        metrics.instrument(self, "gui", (
+            "toggle_timer", "on_key_release", "update_suggestions",
+            "show_summary", "show_analytics", "export_history"
+        ))
         self.create_widgets()
-        self.create_db()
         try:
-            self.check_and_fix_records()
+            self.db        = ActivityDatabase(self.db_name)
+            self.scheduler = TimerScheduler(self.db)
+            self.analytics = Analytics(self.db)
+            self.scheduler.on_status = self.update_status
+            self.scheduler.on_notify = self.notify
+            self.scheduler.on_finish = self.on_timer_finished
+            self.driver              = TimerDriver(self.scheduler, self.master.after, self.master.after_cancel)
+            self.driver.on_focus     = self.show_timer
+            self.driver.on_tick      = self.show_time_left
+            metrics.instrument(self.driver, "gui", ("wakeup",))
+            resumed = self.scheduler.restore()
+            self.db.check_and_fix_records()
+            self.db.activity_index.load(self.db.cursor)
+            self.db.start_writer()
+            # Retention set with `pomodoro_cli.py archive --older-than DAYS`; once a month has
+            # aged past it, its sessions move to the archive, on a worker: the move and the
+            # VACUUM after it can take a while, and a failure is no reason to stop the app
+            retention_days = self.db.get_meta('retention_days')
+            if retention_days:
+                worker = QueryWorker(self.db, self.db.archive_steps(int(retention_days)))
+                BackgroundQuery(self.master, worker, lambda progress, moved: None, self.archive_finished, poll_ms=500)
+            self.notify_bell.set(self.db.get_meta('notify_bell', '1') == '1')
+            self.notifier.bell = self.notify_bell.get()
+            self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+            if metrics.ENABLED:
+                self.master.bind("<F12>", lambda event: MetricsPanel(self.master, self.db))
+            self.activity_name.trace_add("write", lambda *args: self.update_start_button())
+            if resumed:
+                self.focus_timer(resumed[0])
+                self.driver.wakeup()
         except:
             # Get the current working directory
             current_working_directory = os.getcwd()
@@ -94,8 +717,22 @@ class PomodoroTimer:
             messagebox.showerror("DB error!", f"error with db. You should erase it.\ndb path : {current_working_directory}/{self.db_name}")
             self.has_encourted_error = True
         
+    def archive_finished(self, error):
+        if error:
+            messagebox.showwarning("Archive", f"Old sessions could not be moved to the archive:\n{error}")
+
     def has_error(self):
         return self.has_encourted_error
+
+    def close(self):
+        # Commit everything still queued before the process exits
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def on_close(self):
+        self.close()
+        self.master.destroy()
     
     def create_widgets(self):
         row = Row(0)
@@ -150,10 +787,17 @@ class PomodoroTimer:
         self.notify_entry = ttk.Entry(self.notify_frame, width=10)
         self.notify_entry.pack(side=tk.LEFT)
         self.notify_entry.insert(0, "0")  # Set default value to 0
-
-        # Start button
-        self.start_button = tk.Button(self.master, text="Start Timer", command=self.toggle_timer)
-        self.start_button.grid(row=row.next(), column=0, pady=pady, sticky=tk.E)
+        ttk.Checkbutton(self.notify_frame, text="Bell", variable=self.notify_bell, command=self.on_bell_toggle).pack(side=tk.LEFT, padx=(5, 0))
+
+        # Start button, with the cycle option and the list of running timers
+        self.timer_buttons = ttk.Frame(self.master)
+        self.timer_buttons.grid(row=row.next(), column=0, pady=pady, sticky=tk.E)
+        cycle_check = ttk.Checkbutton(self.timer_buttons, text="Cycle", variable=self.cycle_mode)
+        cycle_check.pack(side=tk.LEFT)
+        Tooltip(cycle_check, "Four work phases of this duration, with 5 minute breaks and a 15 minute one at the end")
+        tk.Button(self.timer_buttons, text="Timers", command=lambda: TimersWindow(self)).pack(side=tk.LEFT, padx=5)
+        self.start_button = tk.Button(self.timer_buttons, text="Start Timer", command=self.toggle_timer)
+        self.start_button.pack(side=tk.LEFT)
 
         # Display labels
         self.time_left_text = "Time Left: "
@@ -172,10 +816,10 @@ class PomodoroTimer:
         default_date = today.strftime('%d.%m.%Y')
 
         # Summary input
-        tk.Label(self.master, text="Enter date (dd.MM.YYYY):").grid(row=row.next(), column=0, pady=10, sticky=tk.W+tk.E)
+        tk.Label(self.master, text="Enter date or range (dd.MM.YYYY - dd.MM.YYYY):").grid(row=row.next(), column=0, pady=10, sticky=tk.W+tk.E)
         self.summary_frame = ttk.Frame(self.master)
         self.summary_frame.grid(row=row.next(), column=0, pady=pady, sticky=tk.W+tk.E)
-        self.summary_date_entry = tk.Entry(self.summary_frame, width=10) # Changed parent to self.summary_frame
+        self.summary_date_entry = tk.Entry(self.summary_frame, width=23) # Changed parent to self.summary_frame
         self.summary_date_entry.grid(row=1, column=0, pady=pady, sticky=tk.W+tk.E)
         self.summary_date_entry.insert(0, default_date)  # Set the default date in the entry field
 
@@ -183,6 +827,14 @@ class PomodoroTimer:
         self.summary_button = tk.Button(self.summary_frame, text="Show Summary", command=self.show_summary)
         self.summary_button.grid(row=1, column=1, pady=pady, padx=(10, 0), sticky=tk.E)
 
+        # Export button
+        self.export_button = tk.Button(self.summary_frame, text="Export...", command=self.export_history)
+        self.export_button.grid(row=2, column=0, pady=pady, sticky=tk.E)
+
+        # Analytics button
+        self.analytics_button = tk.Button(self.summary_frame, text="Analytics", command=self.show_analytics)
+        self.analytics_button.grid(row=2, column=1, pady=pady, padx=(10, 0), sticky=tk.W+tk.E)
+
         # Erase missing records button
         # self.erase_missing_button = tk.Button(self.master, text="Erase Missing Records", command=self.erase_missing_records)
         # self.erase_missing_button.grid(row=row.next(), column=0, pady=pady, sticky=tk.E)
@@ -193,83 +845,21 @@ class PomodoroTimer:
         self.progress_bar.grid(row=row.next(), column=1, rowspan=10, padx=20, pady=pady, sticky=tk.N+tk.S)
 
 
-    def create_db(self):
-        self.conn    = sqlite3.connect(self.db_name)
-        self.cursor  = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activities (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS timer_logs (
-                id INTEGER PRIMARY KEY,
-                activity_name TEXT NOT NULL,
-                start_time TEXT NULL,
-                end_time TEXT,
-                status TEXT NOT NULL,
-                date_time TEXT NOT NULL
-            )
-        ''')
-        self.conn.commit()
-
-    def add_activity_to_db(self, activity):
-        try:
-            self.cursor.execute('INSERT INTO activities (name) VALUES (?)', (activity,))
-            self.conn.commit()
-        except sqlite3.IntegrityError:
-            pass  # Activity already exists
-
-    def add_timer_log(self, activity_name, start_time, end_time, status):
-        if start_time:
-            date_time = start_time
-        else:
-            date_time = end_time
-        self.cursor.execute('INSERT INTO timer_logs (activity_name, start_time, end_time, status, date_time) VALUES (?, ?, ?, ?, ?)', (activity_name, start_time, end_time, status, date_time))
-        self.conn.commit()
-
     def search_activities(self, query):
-        self.cursor.execute('SELECT name FROM activities WHERE name LIKE ?', (f'%{query}%',))
-        return [row[0] for row in self.cursor.fetchall()]
-
-    def check_and_fix_records(self):
-        # Fetch all records sorted by their IDs
-        self.cursor.execute('SELECT * FROM timer_logs ORDER BY date_time ASC')
-        records = self.cursor.fetchall()
-
-        # To store new records to insert
-        new_records = []
-
-        for i in range(len(records)):
-            current = records[i]
-            if i < len(records) - 1:
-                next_record = records[i + 1]
-            else:
-                next_record = None
-
-            if next_record:
-                next_rec = next_record[1] 
-
-            if (next_record == None   or   next_record[3] is None)  \
-               and current[4] == "started"                         \
-               and ( next_record == None   or   current[1] != next_record[1]):
-                # If the next record has no end time
-                end_time = current[2]
-                new_record = (current[1], None, end_time, 'missing')
-                new_records.append(new_record)
-
-        # Insert missing records into the database
-        for record in new_records:
-            self.add_timer_log(record[0], record[1], record[2], record[3])
+        return self.db.search_activities(query, self.suggest_limit)
 
     def erase_missing_records(self):
-        # Delete records with status 'missing'
-        self.cursor.execute('DELETE FROM timer_logs WHERE status = ?', ('missing',))
-        self.conn.commit()
+        self.db.erase_missing_records()
         messagebox.showinfo("Info", "All missing records have been deleted.")
 
     def on_key_release(self, event):
+        # Only refresh suggestions once typing pauses
+        if self.suggest_after_id:
+            self.master.after_cancel(self.suggest_after_id)
+        self.suggest_after_id = self.master.after(self.suggest_delay_ms, self.update_suggestions)
+
+    def update_suggestions(self):
+        self.suggest_after_id = None
         query = self.activity_name.get()
         if query:
             suggestions = self.search_activities(query)
@@ -297,35 +887,36 @@ class PomodoroTimer:
 
     def on_ctrl_tab(self, event):
         # Autocomplete using the selected item in the combobox
+        if self.suggest_after_id:
+            self.master.after_cancel(self.suggest_after_id)
+            self.update_suggestions()
         if self.suggestion_combobox['values']:
             self.activity_name.set(self.suggestion_combobox.get())
         return "break"  # Prevent the default behavior of Ctrl+Tab
 
-    def update_status(self, new_status):
-        self.status.set(new_status)
-        self.status_label.config(text=f"Status: {self.status.get()}")
-        
-        # Log status changes
-        if new_status in ["started", "cancelled", "finished"]:
-            self.log_event(new_status)
+    def update_status(self, engine):
+        # Called for every timer; the label follows the one shown
+        if engine is self.engine:
+            self.status.set(engine.status)
+            self.status_label.config(text=f"Status: {self.status.get()}")
+        self.update_start_button()
 
-    def log_event(self, status):
-        activity = self.activity_name.get() if self.activity_name.get() else "No activity"
-        logging.info(f"{status}, {activity}")
+    def update_start_button(self):
+        # Stop when the activity entered has a running timer, Start otherwise
+        if self.scheduler and self.scheduler.find(self.activity_name.get()):
+            self.start_button.config(text="Stop Timer", bg="green")
+        else:
+            self.start_button.config(text="Start Timer", bg=self.master.cget("bg"))
 
     def toggle_timer(self):
-        if self.timer_started:
-            self.stop_timer()
+        engine = self.scheduler.find(self.activity_name.get())
+        if engine:
+            self.stop_timer(engine)
         else:
             self.start_timer()
 
     def start_timer(self):
         try:
-            # Add activity to database when timer starts
-            activity = self.activity_name.get().strip()
-            if activity:
-                self.add_activity_to_db(activity)
-
             notify_before = int(self.notify_entry.get()) * 60  # Convert to seconds
             if self.endtime_entry.get() != "":
                 self.timer_type.set("endtime")
@@ -334,206 +925,138 @@ class PomodoroTimer:
 
             if self.timer_type.get() == "duration":
                 duration  = int(self.duration_entry.get()) * 60  # Convert to seconds
-                end_time  = datetime.datetime.now() + datetime.timedelta(seconds=duration)
             else:
-                end_time  = datetime.datetime.strptime(self.endtime_entry.get(), "%H:%M").replace(
-                    year  = datetime.datetime.now().year,
-                    month = datetime.datetime.now().month,
-                    day   = datetime.datetime.now().day)
-                if end_time <= datetime.datetime.now():
-                    end_time += datetime.timedelta(days=1)
-                duration = (end_time - datetime.datetime.now()).total_seconds()
-
-            # Log the timer activity
-            self.add_timer_log(activity, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), None, "started")
-
-            self.remaining_time = int(duration)
-            self.total_duration = int(duration)
-            self.notify_time    = notify_before
-            self.timer_started  = True
-            self.update_status("started")
-            self.start_button.config(text="Stop Timer", bg="green")
-            self.progress_bar['maximum'] = self.total_duration
-            self.countdown()
+                duration  = seconds_until(self.endtime_entry.get())
         except ValueError:
             messagebox.showerror("Invalid input", "Please enter valid values.")
+            return
 
-    def stop_timer(self):
-        self.timer_started = False
-        end_time           = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.update_status("cancelled")
-        self.add_timer_log(self.activity_name.get().strip(), None, end_time, "cancelled")
+        if self.cycle_mode.get():
+            engine = self.scheduler.start_cycle(self.activity_name.get(), duration, notify_before=notify_before)
+        else:
+            engine = self.scheduler.start(self.activity_name.get(), duration, notify_before)
+        self.focus_timer(engine)
+        self.driver.wakeup()
+
+    def focus_timer(self, engine):
+        # Show a running timer: started here, restored at startup, or picked
+        # in the timers window. The driver picks the next phase of a cycle.
+        self.driver.focus(engine)
+
+    def show_timer(self, engine):
+        self.engine = engine
+        if self.activity_name.get() != engine.activity:
+            self.activity_name.set(engine.activity)
+        self.progress_bar['maximum'] = engine.total_duration
+        self.duration_label.config(text=f"{self.duration_text}{format_duration(engine.total_duration)}")
+        self.update_status(engine)
+
+    def show_time_left(self, engine):
+        seconds = engine.remaining_time
+        self.time_left_label.config(text=f"{self.time_left_text}{format_duration(seconds)}")
+        self.progress_bar['value'] = engine.total_duration - seconds
+
+    def stop_timer(self, engine):
+        engine.stop()
         self.start_button.config(bg="red")
-        self.master.after(1000, self.reset_button_color)
-
-    def reset_button_color(self):
-        self.start_button.config(text="Start Timer", bg=self.master.cget("bg"))
-
-    def countdown(self):
-        if self.remaining_time > 0 and self.timer_started:
-            mins, secs  = divmod(self.remaining_time, 60)
-            hours, mins = divmod(mins, 60)
-            time_str    = f"{hours:02d}:{mins:02d}:{secs:02d}"
-            self.time_left_label.config(text=f"{self.time_left_text}{time_str}")
-
-            total_mins, total_secs  = divmod(self.total_duration, 60)
-            total_hours, total_mins = divmod(total_mins, 60)
-            total_time_str          = f"{total_hours:02d}:{total_mins:02d}:{total_secs:02d}"
-            self.duration_label.config(text=f"{self.duration_text}{total_time_str}")
-
-            if self.remaining_time == self.notify_time:
-                self.notify()
-
-            self.progress_bar['value'] = self.total_duration - self.remaining_time
-
-            self.remaining_time -= 1
-            self.master.after(1000, self.countdown)
-        elif self.remaining_time <= 0:
-            self.timer_started = False
-            self.update_status("finished")
-            self.add_timer_log(self.activity_name.get().strip(), None, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "finished")
-            self.start_button.config(text="Start Timer", bg=self.master.cget("bg"))
+        self.master.after(1000, self.update_start_button)
+        self.driver.wakeup()
+
+    def on_timer_finished(self, engine):
+        if engine is self.engine:
             self.progress_bar['value'] = 0
-            messagebox.showinfo("Time's up!", "Your Pomodoro session has ended!")
-
-    def notify(self):
-        messagebox.showinfo("Reminder", f"{self.notify_time // 60} minutes left!")
-
-    def parse_date(self, date_str):
-        # Define regex patterns for different date formats
-        patterns = [
-            (r'^(\d{2})\.(\d{2})\.(\d{4})$', '%d.%m.%Y'),  # dd.MM.YYYY
-            (r'^(\d{2})\.(\d{2})$', '%d.%m'),              # dd.MM
-            (r'^(\d{2})\.(\d{2})\.(\d{2})$', '%d.%m.%y')   # dd.MM.YY
-        ]
-        
-        today = datetime.date.today()
-        
-        for pattern, date_format in patterns:
-            match = re.match(pattern, date_str)
-            if match:
-                day, month, year = match.groups()
-                # Handle year format (YYYY or YY)
-                if len(year) == 2:
-                    year = '20' + year
-                # Use current year if not provided
-                if not year:
-                    year = today.year
-                if not month:
-                    month = today.month
-                if not day:
-                    day  = today.day
-                # Create a datetime object and return the date part
-                try:
-                    dt = datetime.datetime.strptime(f'{day}.{month}.{year}', date_format)
-                    return dt.date()
-                except ValueError:
-                    messagebox.showerror("Error", "Invalid date format.")
-                    return None
-        messagebox.showerror("Error", "Date does not match any known format.")
-        return None
+        self.update_start_button()
+        self.notifier.notify("Time's up!", f"{engine.activity or 'Your Pomodoro session'} has ended!", sticky=True)
+
+    def notify(self, engine):
+        self.notifier.notify("Reminder", f"{engine.activity or 'Session'}: {engine.notify_time // 60} minutes left!")
+
+    def on_bell_toggle(self):
+        self.notifier.bell = self.notify_bell.get()
+        self.db.set_meta('notify_bell', '1' if self.notifier.bell else '0')
+
+    def parse_date_range(self, range_str):
+        try:
+            return parse_date_range(range_str)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
 
 
 # SUMMARY
     def show_summary(self):
-        date_str          = self.summary_date_entry.get()
-        self.summary_date = self.parse_date(date_str)
+        date_range = self.parse_date_range(self.summary_date_entry.get())
 
-        if not self.summary_date:
+        if not date_range:
             return
+        self.summary_date, self.summary_end_date = date_range
+        SummaryWindow(self.master, self.db, self.summary_date, self.summary_end_date)
 
-        summary_window = tk.Toplevel(self.master)
-        summary_window.title("Activity Summary")
-
-        self.tree = ttk.Treeview(summary_window, columns=("Activity", "Cumulative Time", "Start Time", "End Time"), show="headings")
-        self.tree.heading("Activity",        text="Activity",        command=lambda: self.sort_by("Activity"))
-        self.tree.heading("Cumulative Time", text="Cumulative Time", command=lambda: self.sort_by("Cumulative Time"))
-        self.tree.heading("Start Time",      text="Start Time",      command=lambda: self.sort_by("Start Time"))
-        self.tree.heading("End Time",        text="End Time",        command=lambda: self.sort_by("End Time"))
-
-        start_of_day = datetime.datetime.combine(self.summary_date, datetime.time.min)
-        end_of_day   = datetime.datetime.combine(self.summary_date, datetime.time.max)
-
-        self.cursor.execute('''
-            SELECT activity_name,
-                MIN(start_time) AS first_start_time,
-                SUM(strftime('%s', start_time)) AS sum_starts,
-                SUM(strftime('%s', end_time)) AS sum_ends
-            FROM timer_logs
-            WHERE (start_time BETWEEN ? AND ?)
-            OR (end_time   BETWEEN ? AND ?)
-            GROUP BY activity_name
-        ''', (
-            start_of_day.strftime("%Y-%m-%d %H:%M:%S"),
-            end_of_day.  strftime("%Y-%m-%d %H:%M:%S"),
-            start_of_day.strftime("%Y-%m-%d %H:%M:%S"),
-            end_of_day.  strftime("%Y-%m-%d %H:%M:%S")
-        ))
-
-        nb_act     = 0
-        start_time = None
-        duration   = None
-        end_time   = None
-        for activity_name, first_start, sum_starts, sum_ends in self.cursor.fetchall():
-            nb_act += 1
-
-            # Prepare for treeview
-            start_time = datetime.datetime.strptime(first_start, "%Y-%m-%d %H:%M:%S")
-            duration   = datetime.timedelta(milliseconds=((sum_ends-sum_starts) * 1000))
-            end_time   = start_time + duration
-
-            # Populate treeview
-            self.tree.insert("", "end", values=(
-                activity_name,
-                str(duration),
-                start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                end_time  .strftime("%Y-%m-%d %H:%M:%S")
-            ))
 
-        # Set default sort
-        self.sort_by("Start Time")
-        self.tree.pack(expand=True, fill="both")
-        
+# ANALYTICS
+    def show_analytics(self):
+        try:
+            require_numpy()
+        except ImportError as e:
+            messagebox.showerror("Analytics", str(e))
+            return
 
-    def sort_by(self, column):
-        # Determine the sort order (ascending or descending)
-        if self.tree.heading(column, 'text')[-1] == "▼":
-            order = 'asc'
-        else:
-            order = 'desc'
+        # The summary range is offered as one of the ranges, when it is valid
+        try:
+            summary_range = parse_date_range(self.summary_date_entry.get())
+        except ValueError:
+            summary_range = (datetime.date.today(), datetime.date.today())
+        AnalyticsWindow(self.master, self.analytics, summary_range)
 
-        # Change the sort indicator
-        for col in self.tree["columns"]:
-            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+# EXPORT
+    def export_history(self):
+        date_range = self.parse_date_range(self.summary_date_entry.get())
+        if not date_range:
+            return
+        first_day, last_day = date_range
+
+        path = filedialog.asksaveasfilename(
+            parent=self.master,
+            title="Export sessions",
+            initialfile=f"pomodoro_{first_day:%Y%m%d}-{last_day:%Y%m%d}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Columnar binary", "*.pcol")]
+        )
+        if not path:
+            return
+        activity = simpledialog.askstring("Export sessions", "Only activities containing (empty for all):", parent=self.master)
+        if activity is None:
+            return
 
-        if order == 'asc':
-            self.tree.heading(column, text=column + " ▲", command=lambda: self.sort_by(column))
-        else:
-            self.tree.heading(column, text=column + " ▼", command=lambda: self.sort_by(column))
+        # Large ranges take a while; write on a thread and poll for the result
+        result = queue.Queue()
+        def run():
+            try:
+                result.put(export_sessions(self.db, path, first_day, last_day, activity))
+            except Exception as e:
+                result.put(e)
+        threading.Thread(target=run, daemon=True).start()
+        self.export_button.config(state=tk.DISABLED)
+        self.master.after(100, self.check_export, result, path)
+
+    def check_export(self, result, path):
+        try:
+            rows = result.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self.check_export, result, path)
+            return
 
-        # Retrieve data from the Treeview and sort it
-        data = [(self.tree.item(item)["values"], item) for item in self.tree.get_children()]
-        if column == "Cumulative Time":
-            data.sort(key=lambda x: self.parse_duration(x[0][1]),             reverse=(order == 'desc'))
+        self.export_button.config(state=tk.NORMAL)
+        if isinstance(rows, Exception):
+            messagebox.showerror("Export failed", str(rows))
         else:
-            data.sort(key=lambda x: x[0][self.tree["columns"].index(column)], reverse=(order == 'desc'))
-
-        # Re-insert sorted data into the Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for values, item in data:
-            self.tree.insert("", "end", iid=item, values=values)
-
-    def parse_duration(self, duration_str):
-        # Helper function to parse duration string and return total milliseconds
-        try:
-            td = datetime.datetime.strptime(duration_str, "%H:%M:%S").time()
-            return td.hour * 3600 * 1000 + td.minute * 60 * 1000 + td.second * 1000
-        except ValueError:
-            return 0
+            self.notifier.notify("Export", f"Exported {rows} sessions to {os.path.basename(path)}")
 
 if __name__ == "__main__":
+    if "--metrics" in sys.argv[1:]:
+        metrics.enable()
     root = tk.Tk()
     app = PomodoroTimer(root)
     if not app.has_error():
         root.mainloop()
+    app.close()
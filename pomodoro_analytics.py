@@ -0,0 +1,215 @@
+###########################################################################################
+#                                                                                         #
+# Productivity analytics over the session history.                                        #
+#                                                                                         #
+# Sessions are loaded once per date range as NumPy columns (activity id, start, end,      #
+# status) and every figure is computed with array operations:                             #
+#                                                                                         #
+#   heatmap      seconds worked per weekday and hour of day, split at hour boundaries     #
+#   streaks      longest and current run of days with a finished session                  #
+#   activities   finished, cancelled and missing sessions and time per activity           #
+#   lengths      distribution of finished session lengths in 5 minute bins                #
+#                                                                                         #
+# NumPy is only imported when a report is computed; the timer runs without it.            #
+#                                                                                         #
+###########################################################################################
+
+
+import datetime
+import time
+
+import pomodoro_metrics as metrics
+from pomodoro_engine import SESSION_CANCELLED, SESSION_FINISHED, SESSION_MISSING, day_bounds
+
+
+BIN_SECONDS = 5 * 60
+LENGTH_BINS = 24  # The last bin holds every session of two hours or more
+PERCENTILES = (25, 50, 75, 90)
+WEEKDAYS    = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+np = None
+
+def require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Analytics need NumPy, install it with: pip install numpy") from None
+        np = numpy
+    return np
+
+
+def load_columns(conn, first_day=None, last_day=None, chunk_size=100000):
+    # (n, 4) int64 array of activity id, start, end and status for the sessions
+    # started between first_day and last_day (None: no limit). Sessions still
+    # open end at their start.
+    require_numpy()
+    sql    = 'SELECT activity_id, start_ts, COALESCE(end_ts, start_ts), status FROM sessions WHERE 1'
+    params = []
+    if first_day:
+        sql += ' AND start_ts >= ?'
+        params.append(day_bounds(first_day, first_day)[0])
+    if last_day:
+        sql += ' AND start_ts < ?'
+        params.append(day_bounds(last_day, last_day)[1])
+
+    cursor = conn.execute(sql, params)
+    blocks = []
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        blocks.append(np.array(chunk, dtype=np.int64))
+    return np.concatenate(blocks) if blocks else np.empty((0, 4), dtype=np.int64)
+
+def utc_offset(ts):
+    return time.localtime(ts).tm_gmtoff
+
+def offset_changes(first_ts, last_ts):
+    # Times at which the local UTC offset changes between first_ts and last_ts,
+    # and the offset from each of them on. Offsets are sampled once a day; a
+    # day with a change is bisected to the second.
+    points  = [first_ts]
+    offsets = [utc_offset(first_ts)]
+    ts      = first_ts
+    while ts < last_ts:
+        next_ts = min(ts + 86400, last_ts)
+        offset  = utc_offset(next_ts)
+        if offset != offsets[-1]:
+            low, high = ts, next_ts
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            points.append(high)
+            offsets.append(offset)
+        ts = next_ts
+    return np.array(points, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+def local_times(ts):
+    # Epoch seconds shifted to local wall clock time, so // 86400 gives the local day
+    if not len(ts):
+        return ts
+    points, offsets = offset_changes(int(ts.min()), int(ts.max()))
+    index = np.maximum(np.searchsorted(points, ts, side="right") - 1, 0)
+    return ts + offsets[index]
+
+def to_date(day):
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))).isoformat()
+
+
+def hour_heatmap(local_start, duration):
+    # 7 x 24 seconds worked, Monday first. Each session is repeated once per
+    # hour it touches and clipped to that hour.
+    first_hour = local_start // 3600
+    hours      = (local_start + duration - 1) // 3600 - first_hour + 1
+    session    = np.repeat(np.arange(len(local_start)), hours)
+    hour       = first_hour[session] + np.arange(len(session)) - np.repeat(np.cumsum(hours) - hours, hours)
+
+    start   = local_start[session]
+    seconds = np.minimum(start + duration[session], (hour + 1) * 3600) - np.maximum(start, hour * 3600)
+    cell    = ((hour // 24 + 3) % 7) * 24 + hour % 24  # 1970-01-01 was a Thursday
+    return np.bincount(cell, weights=seconds, minlength=7 * 24).reshape(7, 24)
+
+def day_streaks(days, today):
+    # (longest, its first day, its last day, current) over sorted unique days
+    if not len(days):
+        return {"longest": 0, "longest_from": None, "longest_to": None, "current": 0}
+    breaks  = np.flatnonzero(np.diff(days) != 1)
+    starts  = np.concatenate(([0], breaks + 1))
+    ends    = np.concatenate((breaks, [len(days) - 1]))
+    lengths = ends - starts + 1
+    best    = int(np.argmax(lengths))
+    return {
+        "longest":      int(lengths[best]),
+        "longest_from": to_date(days[starts[best]]),
+        "longest_to":   to_date(days[ends[best]]),
+        # A streak still counts as current until a whole day passes without a session
+        "current":      int(lengths[-1]) if days[-1] >= today - 1 else 0,
+    }
+
+def activity_rates(activity, status, duration, names):
+    # [name, finished, cancelled, missing, seconds] per activity, most time first
+    ids, code = np.unique(activity, return_inverse=True)
+    counts    = np.bincount(code * 4 + status, minlength=len(ids) * 4).reshape(len(ids), 4)
+    seconds   = np.bincount(code, weights=duration, minlength=len(ids))
+    rows = [
+        [names.get(int(activity_id), ""), int(row[SESSION_FINISHED]), int(row[SESSION_CANCELLED]), int(row[SESSION_MISSING]), int(total)]
+        for activity_id, row, total in zip(ids, counts, seconds)
+    ]
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return rows
+
+def compute_report(columns, names, now=None):
+    # Everything the analytics window shows, as plain Python values
+    require_numpy()
+    activity, start, end, status = columns.T
+    duration = end - start
+    worked   = duration > 0
+    local    = local_times(start)
+    finished = status == SESSION_FINISHED
+
+    now     = time.time() if now is None else now
+    today   = (int(now) + utc_offset(now)) // 86400
+    lengths = duration[finished]
+    return {
+        "sessions":    int(len(start)),
+        "seconds":     int(duration.sum()),
+        "heatmap":     hour_heatmap(local[worked], duration[worked]).astype(int).tolist(),
+        "streaks":     day_streaks(np.unique(local[finished] // 86400), today),
+        "activities":  activity_rates(activity, status, duration, names),
+        "length_bins": np.bincount(np.minimum(lengths // BIN_SECONDS, LENGTH_BINS - 1), minlength=LENGTH_BINS).tolist(),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(lengths, PERCENTILES).astype(int).tolist())) if len(lengths) else {},
+    }
+
+
+class Analytics:
+    # Reports per date range, kept until the database changes. PRAGMA
+    # data_version moves on commits of other connections (the writer thread,
+    # other processes), total_changes on those of the connection itself.
+    def __init__(self, db):
+        self.db          = db
+        self.cache       = {}  # (first_day, last_day) -> report
+        self.fingerprint = None
+        metrics.instrument(self, "analytics", ("report", "compute"))
+
+    def changes(self):
+        return self.db.conn.execute('PRAGMA data_version').fetchone()[0], self.db.conn.total_changes
+
+    def cached(self, first_day=None, last_day=None):
+        # The report of a range if it is still current, else None. Called on
+        # the thread of db.conn, which tells whether the database changed.
+        self.db.flush(timeout=2)
+        fingerprint = self.changes()
+        if fingerprint != self.fingerprint or len(self.cache) > 100:
+            self.cache       = {}
+            self.fingerprint = fingerprint
+        return self.cache.get((first_day, last_day))
+
+    def compute(self, conn, first_day=None, last_day=None):
+        # Compute a report reading through conn, which may be a QueryWorker's.
+        # It is cached unless the database changed since cached() last looked.
+        fingerprint = self.fingerprint
+        columns     = load_columns(conn, first_day, last_day)
+        names       = dict(conn.execute('SELECT id, name FROM activities').fetchall())
+        archived    = self.db.archived_sessions(
+            day_bounds(first_day, first_day)[0] if first_day else None,
+            day_bounds(last_day, last_day)[1] if last_day else None,
+            conn
+        )
+        if archived is not None:
+            ids     = {name: activity_id for activity_id, name in names.items()}
+            rows    = [(ids[name], start_ts, end_ts, status) for name, start_ts, end_ts, status in archived]
+            columns = np.concatenate((columns, np.array(rows, dtype=np.int64).reshape(-1, 4)))
+
+        report = compute_report(columns, names)
+        if fingerprint == self.fingerprint:
+            self.cache[(first_day, last_day)] = report
+        return report
+
+    def report(self, first_day=None, last_day=None):
+        report = self.cached(first_day, last_day)
+        return report if report is not None else self.compute(self.db.conn, first_day, last_day)
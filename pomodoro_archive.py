@@ -0,0 +1,102 @@
+###########################################################################################
+#                                                                                         #
+# Archive of old sessions, moved out of the database to keep it small.                    #
+#                                                                                         #
+# One gzip-compressed JSON Lines file per month the sessions started in, next to the      #
+# database file:                                                                          #
+#                                                                                         #
+#   activities-archive/2024-05.jsonl.gz    ["Write report", 1714550400, 1714551900, ...]  #
+#                                                                                         #
+# Lines are [activity, start_ts, end_ts, status], oldest first. Writing a month again     #
+# merges with what the file holds, so a move interrupted before the database commit is    #
+# simply repeated. ActivityDatabase.archive_sessions() does the moving.                   #
+#                                                                                         #
+###########################################################################################
+
+
+import datetime
+import gzip
+import json
+import os
+import re
+
+
+MONTH_FILE_RE = re.compile(r"([0-9]{4}-[0-9]{2})\.jsonl\.gz")
+
+
+def archive_root(db_name):
+    # activities.db -> activities-archive
+    return os.path.splitext(db_name)[0] + "-archive"
+
+def month_of(ts):
+    # "YYYY-MM" of the local month holding epoch seconds ts
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m")
+
+def month_start(month):
+    # Epoch seconds of the local start of a "YYYY-MM" month
+    year, number = map(int, month.split("-"))
+    return int(datetime.datetime(year, number, 1).timestamp())
+
+def next_month(month):
+    year, number = map(int, month.split("-"))
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+class SessionArchive:
+    def __init__(self, root):
+        self.root = root
+        self.keys = {}  # month -> {(activity, start_ts)}, loaded by contains()
+
+    def path(self, month):
+        return os.path.join(self.root, f"{month}.jsonl.gz")
+
+    def months(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(match[1] for match in map(MONTH_FILE_RE.fullmatch, os.listdir(self.root)) if match)
+
+    def read(self, month):
+        # Yield (activity, start_ts, end_ts, status) of one month, oldest first
+        try:
+            with gzip.open(self.path(month), "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield tuple(json.loads(line))
+        except FileNotFoundError:
+            return
+
+    def write(self, month, sessions):
+        # Add sessions to a month file; a session already in it (same activity
+        # and start) is kept once. The file is replaced once complete.
+        merged = {(row[0], row[1]): row for row in self.read(month)}
+        merged.update(((row[0], row[1]), tuple(row)) for row in sessions)
+        rows = sorted(merged.values(), key=lambda row: (row[1], row[0]))
+
+        path = self.path(month)
+        os.makedirs(self.root, exist_ok=True)
+        with gzip.open(path + ".part", "wt", encoding="utf-8") as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        os.replace(path + ".part", path)
+        self.keys.pop(month, None)
+        return len(rows)
+
+    def sessions(self, first_ts=None, last_ts=None):
+        # Yield the archived sessions starting in [first_ts, last_ts) (None: no
+        # limit), oldest first. Only the month files of the range are opened.
+        first_month = month_of(first_ts) if first_ts is not None else ""
+        last_month  = month_of(last_ts - 1) if last_ts is not None else "9999"
+        for month in self.months():
+            if not first_month <= month <= last_month:
+                continue
+            for row in self.read(month):
+                if (first_ts is None or row[1] >= first_ts) and (last_ts is None or row[1] < last_ts):
+                    yield row
+
+    def contains(self, activity, start_ts, slack=0):
+        # Whether the archive holds a session of activity starting within
+        # slack seconds of start_ts
+        for month in {month_of(start_ts - slack), month_of(start_ts + slack)}:
+            if month not in self.keys:
+                self.keys[month] = {(row[0], row[1]) for row in self.read(month)}
+            if any((activity, ts) in self.keys[month] for ts in range(start_ts - slack, start_ts + slack + 1)):
+                return True
+        return False
@@ -0,0 +1,246 @@
+###########################################################################################
+#                                                                                         #
+# Command line front end for the Pomodoro timer. Never imports tkinter.                   #
+#                                                                                         #
+#   python pomodoro_cli.py start --activity "Write report" --minutes 25 --notify 5        #
+#   python pomodoro_cli.py status                                                         #
+#   python pomodoro_cli.py stop                                                           #
+#   python pomodoro_cli.py summary --from 01.05.2024 --to 31.05.2024 --by day             #
+#   python pomodoro_cli.py import-logs pomodoro.csv pomodoro.csv.1.gz                     #
+#   python pomodoro_cli.py export history.csv --from 01.01.2024 --activity report         #
+#   python pomodoro_cli.py sync --dir /mnt/share/pomodoro-sync                            #
+#   python pomodoro_cli.py archive --older-than 365                                       #
+#                                                                                         #
+###########################################################################################
+
+
+import argparse
+import datetime
+import math
+import os
+import sys
+
+from pomodoro_engine import (
+    ActivityDatabase, SummaryModel, TimerScheduler, format_duration, parse_date, seconds_until
+)
+from pomodoro_export import FORMATS, export_sessions
+from pomodoro_intervals import ALL_ACTIVITIES, BUCKET_UNITS, summarize
+from pomodoro_logs import configure_logging, import_logs, log_files
+import pomodoro_metrics as metrics
+
+
+DEFAULT_RETENTION_DAYS = 365
+
+
+def cmd_start(args, db, scheduler):
+    if scheduler.find(args.activity):
+        print(f"A timer is already running for '{args.activity.strip()}'", file=sys.stderr)
+        return 1
+
+    if args.until:
+        duration = seconds_until(args.until)
+    else:
+        duration = args.minutes * 60
+    if args.cycle:
+        engine = scheduler.start_cycle(args.activity, duration, args.short_break * 60, args.long_break * 60, args.rounds, args.notify * 60)
+    else:
+        engine = scheduler.start(args.activity, duration, args.notify * 60)
+    print(f"Started '{engine.activity}' until {engine.ends_at:%H:%M:%S}")
+    return 0
+
+def cmd_stop(args, db, scheduler):
+    running = scheduler.running
+    if args.activity is not None:
+        running = [engine for engine in running if engine.activity == args.activity.strip()]
+    if not running:
+        print("No timer running", file=sys.stderr)
+        return 1
+    if len(running) > 1 and not args.all:
+        names = ", ".join(f"'{engine.activity}'" for engine in running)
+        print(f"Several timers running ({names}), pick one with --activity or use --all", file=sys.stderr)
+        return 1
+
+    for engine in running:
+        engine.stop()
+        print(f"Timer {engine.status}: '{engine.activity}'")
+    return 0
+
+def cmd_status(args, db, scheduler):
+    if not scheduler.running:
+        print("No timer running")
+        return 0
+
+    for engine in scheduler.running:
+        remaining = format_duration(math.ceil(engine.remaining()))
+        phase     = f" (cycle phase {engine.cycle['phase'] + 1} of {engine.cycle['rounds'] * 2})" if engine.cycle else ""
+        print(f"{engine.activity}: {remaining} left, ends at {engine.ends_at:%H:%M:%S}{phase}")
+    return 0
+
+def cmd_summary(args, db, scheduler):
+    first = parse_date(args.first) if args.first else datetime.date.today()
+    last  = parse_date(args.last)  if args.last  else first
+    if last < first:
+        first, last = last, first
+
+    if args.by:
+        return print_periods(summarize(db, first, last, args.by))
+
+    rows  = db.summary(first, last)
+    model = SummaryModel(rows)
+    model.sort("Start Time")
+
+    width = max([len("Activity")] + [len(row[0]) for row in rows])
+    print(f"{'Activity':<{width}}  {'Cumulative Time':>15}  {'Start Time':<19}  End Time")
+    for index in range(len(model)):
+        activity_name, duration, first_start, last_end = model.values(index)
+        print(f"{activity_name:<{width}}  {duration:>15}  {first_start:<19}  {last_end}")
+    print(f"{'Total':<{width}}  {format_duration(sum(row[1] for row in rows)):>15}")
+    return 0
+
+def print_periods(buckets):
+    # One block per hour, day or week; overlapping timers are counted once in the total
+    width = max([len(ALL_ACTIVITIES)] + [len(row[0]) for _, _, rows, _ in buckets for row in rows])
+    for _, label, rows, busy in buckets:
+        print(label)
+        for activity_name, seconds, sessions, _, _ in rows:
+            print(f"  {activity_name:<{width}}  {format_duration(seconds):>10}  {sessions:>4} sessions")
+        if len(rows) > 1:
+            print(f"  {ALL_ACTIVITIES:<{width}}  {format_duration(busy):>10}")
+    return 0
+
+def cmd_backfill(args, db, scheduler):
+    sessions = db.backfill_rollups()
+    print(f"Rebuilt daily totals from {sessions} sessions in {db.db_name}")
+    return 0
+
+def cmd_import_logs(args, db, scheduler):
+    paths = args.paths or log_files()
+    read, inserted = import_logs(db, paths)
+    print(f"Imported {inserted} of {read} sessions from {len(paths)} log files")
+    return 0
+
+def cmd_export(args, db, scheduler):
+    first = parse_date(args.first) if args.first else None
+    last  = parse_date(args.last)  if args.last  else None
+    if first and last and last < first:
+        first, last = last, first
+
+    rows = export_sessions(db, args.path, first, last, args.activity, args.format)
+    print(f"Exported {rows} sessions to {args.path}")
+    return 0
+
+def cmd_archive(args, db, scheduler):
+    # The age given is kept, and the GUI applies it at startup from then on
+    if args.older_than is not None:
+        db.set_meta('retention_days', str(args.older_than))
+    days   = int(db.get_meta('retention_days', str(DEFAULT_RETENTION_DAYS)))
+    before = os.path.getsize(db.db_name)
+    moved  = db.archive_sessions(days)
+    print(f"Moved {moved} sessions older than {days} days to {db.archive.root}")
+    print(f"{db.db_name}: {before // 1024} KB -> {os.path.getsize(db.db_name) // 1024} KB")
+    return 0
+
+def cmd_sync(args, db, scheduler):
+    # Imported here: the HTTP and SSL modules it needs would slow every command's startup
+    from pomodoro_sync import DirectoryTransport, HttpTransport, sync
+    transport = DirectoryTransport(args.dir) if args.dir else HttpTransport(args.url)
+    sent, received = sync(db, transport)
+    print(f"Sent {sent} sessions, received {received} sessions")
+    return 0
+
+def cmd_sync_server(args, db, scheduler):
+    from pomodoro_sync import SyncServer
+    server = SyncServer(args.dir, args.host, args.port)
+    print(f"Serving changesets from {args.dir} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pomodoro_cli.py", description="Pomodoro timer without the GUI")
+    parser.add_argument("--db", default="activities.db", help="database file (default: activities.db)")
+    parser.add_argument("--metrics", metavar="FILE", help="record timings and write them to FILE as JSON on exit")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    start = commands.add_parser("start", help="start a timer")
+    start.add_argument("--activity", default="", help="activity name")
+    length = start.add_mutually_exclusive_group()
+    length.add_argument("--minutes", type=int, default=25, help="duration in minutes (default: 25)")
+    length.add_argument("--until", metavar="HH:MM", help="end time instead of a duration")
+    start.add_argument("--notify", type=int, default=0, metavar="MINUTES", help="reminder before the end")
+    start.add_argument("--cycle", action="store_true", help="work/break cycle, the duration is the length of a work phase")
+    start.add_argument("--short-break", type=int, default=5,  metavar="MINUTES", help="break after a work phase (default: 5)")
+    start.add_argument("--long-break",  type=int, default=15, metavar="MINUTES", help="break after the last work phase (default: 15)")
+    start.add_argument("--rounds",      type=int, default=4,  help="work phases in a cycle (default: 4)")
+    start.set_defaults(func=cmd_start)
+
+    stop = commands.add_parser("stop", help="stop a running timer")
+    stop.add_argument("--activity", help="the timer to stop, when several run")
+    stop.add_argument("--all", action="store_true", help="stop every running timer")
+    stop.set_defaults(func=cmd_stop)
+
+    commands.add_parser("status", help="show the running timers").set_defaults(func=cmd_status)
+
+    summary = commands.add_parser("summary", help="time per activity over a date range")
+    summary.add_argument("--from", dest="first", metavar="DATE", help="first day, dd.MM.YYYY (default: today)")
+    summary.add_argument("--to",   dest="last",  metavar="DATE", help="last day, dd.MM.YYYY (default: --from)")
+    summary.add_argument("--by", choices=BUCKET_UNITS, help="split the time at hour, day or week boundaries")
+    summary.set_defaults(func=cmd_summary)
+
+    commands.add_parser("backfill", help="rebuild the daily totals from the sessions").set_defaults(func=cmd_backfill)
+
+    import_parser = commands.add_parser("import-logs", help="load sessions from event log files into the database")
+    import_parser.add_argument("paths", nargs="*", help="log files, plain or .gz (default: pomodoro.csv and its rotated segments)")
+    import_parser.set_defaults(func=cmd_import_logs)
+
+    export = commands.add_parser("export", help="write the session history to a file")
+    export.add_argument("path", help="output file; .csv, .jsonl or .pcol picks the format")
+    export.add_argument("--from", dest="first", metavar="DATE", help="first day, dd.MM.YYYY (default: oldest session)")
+    export.add_argument("--to",   dest="last",  metavar="DATE", help="last day, dd.MM.YYYY (default: newest session)")
+    export.add_argument("--activity", help="only activities whose name contains this")
+    export.add_argument("--format", choices=list(FORMATS), help="output format (default: from the file extension)")
+    export.set_defaults(func=cmd_export)
+
+    archive = commands.add_parser("archive", help="move old sessions to monthly archive files and compact the database")
+    archive.add_argument("--older-than", type=int, metavar="DAYS", help=f"age of the sessions to move, kept for later runs (default: the last one given, else {DEFAULT_RETENTION_DAYS})")
+    archive.set_defaults(func=cmd_archive)
+
+    sync_parser = commands.add_parser("sync", help="exchange new sessions with the databases of other devices")
+    where = sync_parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--dir", help="shared directory of changesets")
+    where.add_argument("--url", help="sync server, e.g. http://127.0.0.1:8765")
+    sync_parser.set_defaults(func=cmd_sync)
+
+    server = commands.add_parser("sync-server", help="serve a directory of changesets over HTTP")
+    server.add_argument("--dir",  required=True, help="directory to keep the changesets in")
+    server.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    server.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    server.set_defaults(func=cmd_sync_server)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    configure_logging()
+
+    db        = ActivityDatabase(args.db)
+    scheduler = TimerScheduler(db)
+    try:
+        scheduler.restore()
+        return args.func(args, db, scheduler)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+        if args.metrics:
+            metrics.dump(args.metrics)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1494 @@
+###########################################################################################
+#                                                                                         #
+# Pomodoro engine: timer state machine, database layer and date parsing.                  #
+#                                                                                         #
+# Nothing in this module imports tkinter, so it can be used from the command line,        #
+# from scripts and on headless machines. pomodoro.py builds the GUI on top of it.         #
+#                                                                                         #
+###########################################################################################
+
+
+import sqlite3
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import re
+import math
+import pathlib
+import queue
+import threading
+import time
+
+import pomodoro_metrics as metrics
+from pomodoro_archive import SessionArchive, archive_root, month_of, month_start, next_month
+from pomodoro_logs import log_event
+
+
+def format_timestamp(ts):
+    # Epoch seconds as local "%Y-%m-%d %H:%M:%S"
+    return datetime.datetime.fromtimestamp(int(ts)).isoformat(" ") if ts is not None else ""
+
+def format_duration(seconds):
+    # HH:MM:SS, with hours allowed to go past 24
+    mins, secs  = divmod(int(seconds), 60)
+    hours, mins = divmod(mins, 60)
+    return f"{hours:02d}:{mins:02d}:{secs:02d}"
+
+def parse_date(date_str):
+    # Define regex patterns for different date formats
+    patterns = [
+        r'^(\d{2})\.(\d{2})\.(\d{4})$',  # dd.MM.YYYY
+        r'^(\d{2})\.(\d{2})$',           # dd.MM
+        r'^(\d{2})\.(\d{2})\.(\d{2})$'   # dd.MM.YY
+    ]
+
+    today = datetime.date.today()
+
+    for pattern in patterns:
+        match = re.match(pattern, date_str.strip())
+        if match:
+            day, month, year = (match.groups() + (None,))[:3]
+            # Use current year if not provided, handle YY
+            if not year:
+                year = str(today.year)
+            elif len(year) == 2:
+                year = '20' + year
+            try:
+                return datetime.date(int(year), int(month), int(day))
+            except ValueError:
+                raise ValueError("Invalid date format.")
+    raise ValueError("Date does not match any known format.")
+
+def parse_date_range(range_str):
+    # A single date, or two dates separated by "-" (dates themselves use ".")
+    parts = [part.strip() for part in range_str.split("-")]
+    if len(parts) > 2:
+        raise ValueError("Enter a date or a range like 01.05.2024 - 31.05.2024.")
+
+    first, last = parse_date(parts[0]), parse_date(parts[-1])
+    if last < first:
+        first, last = last, first
+    return first, last
+
+def seconds_until(end_time_str, now=None):
+    # Seconds from now until the next occurrence of HH:MM
+    now      = now or datetime.datetime.now()
+    end_time = datetime.datetime.strptime(end_time_str, "%H:%M").replace(year=now.year, month=now.month, day=now.day)
+    if end_time <= now:
+        end_time += datetime.timedelta(days=1)
+    return (end_time - now).total_seconds()
+
+
+class ActivityIndex:
+    # Case-insensitive substring matching over activity names, kept in memory.
+    # Names are stored in rank order (most used first, then most recent), so a
+    # filtered candidate list is already ranked and a query never sorts.
+    def __init__(self):
+        self.names  = []
+        self.usage  = {}  # name -> (use count, last start as epoch seconds)
+        self.order  = []  # (folded name, name) in rank order
+        self.cache  = {}  # folded query -> ranked candidates
+
+    def load(self, cursor):
+        cursor.execute("SELECT name FROM activities WHERE name != ''")
+        self.names = [row[0] for row in cursor.fetchall()]
+        cursor.execute('''
+            SELECT activities.name, usage.sessions, usage.last_start
+            FROM (
+                SELECT activity_id, COUNT(*) AS sessions, MAX(start_ts) AS last_start
+                FROM sessions
+                GROUP BY activity_id
+            ) AS usage
+            JOIN activities ON activities.id = usage.activity_id
+        ''')
+        self.usage = {name: (count, last_used) for name, count, last_used in cursor.fetchall()}
+        self.rebuild()
+
+    def rebuild(self):
+        ranked = sorted(self.names, key=lambda name: self.usage.get(name, (0, 0))[1], reverse=True)
+        ranked.sort(key=lambda name: self.usage.get(name, (0, 0))[0], reverse=True)
+        self.order = [(name.lower(), name) for name in ranked]
+        self.cache = {}
+
+    def add(self, name):
+        if name not in self.names:
+            self.names.append(name)
+            self.rebuild()
+
+    def record_use(self, name, start_ts):
+        if name not in self.names:
+            self.names.append(name)
+        count, last_used = self.usage.get(name, (0, 0))
+        self.usage[name] = (count + 1, max(last_used, start_ts))
+        self.rebuild()
+
+    def search(self, query, limit=None):
+        folded     = query.lower()
+        candidates = self.candidates(folded)
+        prefixed   = [name for key, name in candidates if key.startswith(folded)]
+        others     = [name for key, name in candidates if not key.startswith(folded)]
+        return (prefixed + others)[:limit]
+
+    def candidates(self, folded):
+        if folded in self.cache:
+            return self.cache[folded]
+
+        # Matches for a query are a subset of the matches for any of its prefixes
+        pool = self.order
+        for length in range(len(folded) - 1, 0, -1):
+            if folded[:length] in self.cache:
+                pool = self.cache[folded[:length]]
+                break
+
+        if len(self.cache) > 1000:
+            self.cache = {}
+        self.cache[folded] = [entry for entry in pool if folded in entry[0]]
+        return self.cache[folded]
+
+
+def is_busy(error):
+    # Another connection holds the write lock; trying again later succeeds
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+class DbWriter(threading.Thread):
+    # Owns the write connection. The UI thread only enqueues statements; they are
+    # applied in arrival order and committed in groups, one fsync per group.
+    # While another process holds the write lock (a VACUUM, a large import) a
+    # group is rolled back and tried again, so no write is lost to it.
+    BUSY_DELAY     = 0.1  # Seconds before the first retry, doubled up to BUSY_MAX_DELAY
+    BUSY_MAX_DELAY = 2.0
+    FLUSH_POLL     = 0.1  # Seconds between checks that the thread is still alive
+
+    def __init__(self, db_name, batch_size=500, batch_wait=0.05):
+        super().__init__(name="db-writer", daemon=True)
+        self.db_name        = db_name
+        self.batch_size     = batch_size
+        self.batch_wait     = batch_wait  # Seconds to wait for more statements
+        self.queue          = queue.Queue()
+        self.flush_count    = 0
+        self.last_flush_ms  = 0.0
+        self.max_flush_ms   = 0.0
+        self.total_flush_ms = 0.0
+        self.error_count    = 0
+        self.busy_count     = 0
+        self.last_error     = None
+        self.failure        = None  # The exception that stopped the thread
+
+    def execute(self, sql, params=()):
+        self.queue.put((sql, params))
+
+    def flush(self, timeout=None):
+        # Block until everything queued so far is committed. False on timeout;
+        # raises once the thread has stopped, as nothing queued would be committed.
+        done     = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.queue.put((None, done))
+        while True:
+            wait = self.FLUSH_POLL if deadline is None else min(self.FLUSH_POLL, deadline - time.monotonic())
+            if done.wait(max(wait, 0)):
+                return True
+            if not self.is_alive():
+                raise sqlite3.DatabaseError(f"The database writer has stopped: {self.failure or 'closed'}")
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        self.queue.put((None, None))
+        self.join()
+
+    def stats(self):
+        return {
+            "queue_depth":    self.queue.qsize(),
+            "flush_count":    self.flush_count,
+            "last_flush_ms":  self.last_flush_ms,
+            "max_flush_ms":   self.max_flush_ms,
+            "avg_flush_ms":   self.total_flush_ms / self.flush_count if self.flush_count else 0.0,
+            "error_count":    self.error_count,
+            "busy_count":     self.busy_count,
+            "last_error":     self.last_error,
+        }
+
+    def run(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+
+        running = True
+        try:
+            while running:
+                batch    = [self.queue.get()]
+                deadline = time.monotonic() + self.batch_wait
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                running = self.apply(conn, batch)
+
+            # Move the WAL back into the main file so nothing is left pending on exit
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except Exception as e:
+            # flush() raises from now on instead of waiting forever
+            self.failure    = e
+            self.last_error = str(e)
+            logging.error(f"Database writer stopped: {e}")
+        finally:
+            conn.close()
+
+    def apply(self, conn, batch):
+        start = time.perf_counter()
+        delay = self.BUSY_DELAY
+        while True:
+            try:
+                running, waiters = self.commit(conn, batch)
+                break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                conn.rollback()
+                self.busy_count += 1
+                self.last_error  = f"{e}, retrying"
+                if delay == self.BUSY_DELAY:
+                    logging.warning(f"Database busy, keeping {len(batch)} writes queued: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.BUSY_MAX_DELAY)
+
+        elapsed              = (time.perf_counter() - start) * 1000
+        self.flush_count    += 1
+        self.last_flush_ms   = elapsed
+        self.max_flush_ms    = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+        if metrics.ENABLED:
+            metrics.record("db.commit", elapsed / 1000)
+            metrics.count("db.statements", sum(1 for sql, _ in batch if sql is not None))
+        for done in waiters:
+            done.set()
+        return running
+
+    def commit(self, conn, batch):
+        # Apply a batch as one transaction; returns (keep running, flush
+        # waiters). A statement that fails for good (a constraint) is logged
+        # and skipped, a busy database fails the whole batch.
+        waiters = []
+        running = True
+        with conn:
+            for sql, params in batch:
+                if sql is not None:
+                    try:
+                        conn.execute(sql, params)
+                    except sqlite3.Error as e:
+                        if is_busy(e):
+                            raise
+                        self.error_count += 1
+                        self.last_error   = f"{e} ({sql.strip()})"
+                        logging.error(f"Database write failed: {self.last_error} {params}")
+                elif params is None:
+                    running = False
+                else:
+                    waiters.append(params)
+        return running, waiters
+
+class QueryWorker(threading.Thread):
+    # Runs a long read on its own read-only connection, off the UI thread.
+    # steps(conn) is a generator of (progress, rows), progress from 0 to 1 or
+    # None when unknown; each step goes on `results` for the UI to poll. The
+    # worker ends with DONE, or with the exception that stopped it. cancel()
+    # interrupts the statement running and stops at the next step.
+    DONE = (1.0, None)
+
+    def __init__(self, db, steps):
+        super().__init__(name="db-query", daemon=True)
+        self.db        = db
+        self.steps     = steps
+        self.results   = queue.Queue()
+        self.cancelled = threading.Event()
+        self.conn      = None
+
+    def cancel(self):
+        self.cancelled.set()
+        conn = self.conn
+        if conn:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass  # Already finished and closed
+
+    def run(self):
+        try:
+            self.conn = self.db.open_reader()
+            for step in self.steps(self.conn):
+                if self.cancelled.is_set():
+                    return
+                self.results.put(step)
+            self.results.put(self.DONE)
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.results.put(e)
+        finally:
+            if self.conn:
+                self.conn.close()
+
+
+# sessions.status codes
+SESSION_STARTED   = 0  # Still running, end_ts is NULL
+SESSION_FINISHED  = 1
+SESSION_CANCELLED = 2
+SESSION_MISSING   = 3  # Lost its end, closed by check_and_fix_records
+SESSION_STATUSES  = ("started", "finished", "cancelled", "missing")
+
+def split_by_day(start, end):
+    # Yield the (start, end) pieces of an interval, one per calendar day
+    while start.date() < end.date():
+        midnight = datetime.datetime.combine(start.date() + datetime.timedelta(days=1), datetime.time.min)
+        yield start, midnight
+        start = midnight
+    yield start, max(start, end)
+
+def rollup_rows(activity, start_ts, end_ts):
+    # daily_totals rows for one session; the session is counted on its first day
+    start = datetime.datetime.fromtimestamp(start_ts)
+    end   = datetime.datetime.fromtimestamp(end_ts)
+    rows  = []
+    for piece_start, piece_end in split_by_day(start, end):
+        rows.append((
+            piece_start.date().isoformat(),
+            activity,
+            int((piece_end - piece_start).total_seconds()),
+            0 if rows else 1,
+            int(piece_start.timestamp()),
+            int(piece_end.timestamp())
+        ))
+    return rows
+
+DAILY_TOTALS_UPSERT = '''
+    INSERT INTO daily_totals (day, activity_id, seconds, sessions, first_start, last_end)
+    VALUES (?, (SELECT id FROM activities WHERE name = ?), ?, ?, ?, ?)
+    ON CONFLICT (day, activity_id) DO UPDATE SET
+        seconds     = seconds + excluded.seconds,
+        sessions    = sessions + excluded.sessions,
+        first_start = MIN(first_start, excluded.first_start),
+        last_end    = MAX(last_end, excluded.last_end)
+'''
+
+# The same for a session closed by the statement just before, and only if it
+# did close one: changes() still counts the rows of that statement (and then
+# of the previous upsert, for a session over several days)
+DAILY_TOTALS_UPSERT_CLOSED = '''
+    INSERT INTO daily_totals (day, activity_id, seconds, sessions, first_start, last_end)
+    SELECT ?, (SELECT id FROM activities WHERE name = ?), ?, ?, ?, ?
+    WHERE changes() > 0
+    ON CONFLICT (day, activity_id) DO UPDATE SET
+        seconds     = seconds + excluded.seconds,
+        sessions    = sessions + excluded.sessions,
+        first_start = MIN(first_start, excluded.first_start),
+        last_end    = MAX(last_end, excluded.last_end)
+'''
+
+# Sessions longer than this are not looked for when rebuilding part of the rollup
+MAX_SESSION_SECONDS = 7 * 24 * 3600
+
+def backfill_daily_totals(cursor, first_day=None, last_day=None, archived=()):
+    # Rebuild daily_totals from closed sessions, for every day or only for the
+    # days first_day..last_day. archived adds (activity_id, start_ts, end_ts)
+    # of sessions no longer in the table.
+    reader = cursor.connection.cursor()
+    if first_day is None:
+        cursor.execute('DELETE FROM daily_totals')
+        reader.execute('SELECT activity_id, start_ts, end_ts FROM sessions WHERE end_ts IS NOT NULL')
+    else:
+        cursor.execute('DELETE FROM daily_totals WHERE day BETWEEN ? AND ?', (first_day.isoformat(), last_day.isoformat()))
+        range_start, range_end = day_bounds(first_day, last_day)
+        reader.execute('''
+            SELECT activity_id, start_ts, end_ts
+            FROM sessions
+            WHERE start_ts >= ? AND start_ts < ? AND end_ts IS NOT NULL
+        ''', (range_start - MAX_SESSION_SECONDS, range_end))
+    first_day = first_day.isoformat() if first_day else ""
+    last_day  = last_day.isoformat()  if last_day  else "9999"
+
+    totals   = {}  # (day, activity_id) -> [seconds, sessions, first_start, last_end]
+    sessions = 0
+    for activity_id, start_ts, end_ts in itertools.chain(reader, archived):
+        sessions += 1
+        for day, _, seconds, counted, first_start, last_end in rollup_rows(activity_id, start_ts, end_ts):
+            if not first_day <= day <= last_day:
+                continue
+            total = totals.get((day, activity_id))
+            if total:
+                total[0] += seconds
+                total[1] += counted
+                total[2]  = min(total[2], first_start)
+                total[3]  = max(total[3], last_end)
+            else:
+                totals[(day, activity_id)] = [seconds, counted, first_start, last_end]
+
+    cursor.executemany(
+        'INSERT INTO daily_totals (day, activity_id, seconds, sessions, first_start, last_end) VALUES (?, ?, ?, ?, ?, ?)',
+        (key + tuple(total) for key, total in totals.items())
+    )
+    return sessions
+
+SUMMARY_SQL = '''
+    SELECT activities.name,
+        SUM(seconds)     AS total_seconds,
+        MIN(first_start) AS first_start_ts,
+        MAX(last_end)    AS last_end_ts
+    FROM daily_totals
+    JOIN activities ON activities.id = daily_totals.activity_id
+    WHERE day BETWEEN ? AND ?
+    GROUP BY daily_totals.activity_id
+'''
+
+def summary_steps(conn, first_day, last_day, chunk_size=1000):
+    # ActivityDatabase.summary() for a QueryWorker: yields (None, rows) chunks
+    cursor = conn.execute(SUMMARY_SQL, (first_day.isoformat(), last_day.isoformat()))
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield None, chunk
+
+def day_bounds(first_day, last_day):
+    # Epoch seconds from the start of first_day to the end of last_day
+    start = datetime.datetime.combine(first_day, datetime.time.min).timestamp()
+    end   = datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min).timestamp()
+    return int(start), int(end)
+
+def activity_matches(name, query):
+    # The one rule for "names containing query", live or archived: Python's
+    # casefold(), as SQLite's lower() only folds ASCII letters
+    return query.casefold() in name.casefold()
+
+def iter_sessions(conn, first_day, last_day, activity=None, chunk_size=10000, archived=None):
+    # Yield lists of (activity, start_ts, end_ts, status) for the sessions that
+    # started between first_day and last_day (None: no limit), oldest first.
+    # `activity` keeps only names containing it. Rows are fetched chunk_size at
+    # a time, so the memory used does not depend on the length of the range.
+    # archived rows (see ActivityDatabase.archived_sessions) are merged in.
+    sql = '''
+        SELECT activities.name, sessions.start_ts, sessions.end_ts, sessions.status
+        FROM sessions
+        JOIN activities ON activities.id = sessions.activity_id
+        WHERE 1
+    '''
+    params = []
+    if first_day:
+        sql += " AND sessions.start_ts >= ?"
+        params.append(day_bounds(first_day, first_day)[0])
+    if last_day:
+        sql += " AND sessions.start_ts < ?"
+        params.append(day_bounds(last_day, last_day)[1])
+    if activity:
+        # Matched against the activities table, which is small; the sessions
+        # are then picked by id
+        ids = [activity_id for activity_id, name in conn.execute('SELECT id, name FROM activities') if activity_matches(name, activity)]
+        sql += " AND sessions.activity_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(ids))
+    cursor = conn.execute(sql + " ORDER BY sessions.start_ts, sessions.id", params)
+    if archived is not None:
+        if activity:
+            archived = (row for row in archived if activity_matches(row[0], activity))
+        rows = heapq.merge(archived, itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(chunk_size), [])), key=lambda row: row[1])
+        yield from iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+        return
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+# Schema migrations, applied in order. PRAGMA user_version holds the number of
+# migrations already applied to a database file.
+def migrate_v1_create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activities (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timer_logs (
+            id INTEGER PRIMARY KEY,
+            activity_name TEXT NOT NULL,
+            start_time TEXT NULL,
+            end_time TEXT,
+            status TEXT NOT NULL,
+            date_time TEXT NOT NULL
+        )
+    ''')
+
+def migrate_v2_add_indexes(cursor):
+    # Covers the full row so check_and_fix_records never touches the table
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_timer_logs_date_time
+        ON timer_logs (date_time, activity_name, start_time, end_time, status)
+    ''')
+    # Cover the summary query, one index per side of the time window
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_timer_logs_start_time
+        ON timer_logs (start_time, activity_name, end_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_timer_logs_end_time
+        ON timer_logs (end_time, activity_name, start_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_timer_logs_activity_name
+        ON timer_logs (activity_name, date_time)
+    ''')
+    cursor.execute('ANALYZE')
+
+def migrate_v3_add_meta(cursor):
+    # Small key/value store for bookkeeping such as the repair watermark
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # Include id in the date_time index so the startup repair can resume from
+    # an exact (date_time, id) position and ties keep their insertion order
+    cursor.execute('DROP INDEX IF EXISTS idx_timer_logs_date_time')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_timer_logs_date_time_id
+        ON timer_logs (date_time, id, activity_name, start_time, end_time, status)
+    ''')
+
+def migrate_v4_add_daily_totals(cursor):
+    # Per-day, per-activity totals so summaries over long ranges read a few rows
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            day TEXT NOT NULL,
+            activity_name TEXT NOT NULL,
+            seconds INTEGER NOT NULL,
+            sessions INTEGER NOT NULL,
+            first_start TEXT,
+            last_end TEXT,
+            PRIMARY KEY (day, activity_name)
+        ) WITHOUT ROWID
+    ''')
+    # Filled by migration 5, which rebuilds the table from sessions
+
+TIMER_LOGS_VIEW = '''
+    CREATE VIEW timer_logs AS
+    SELECT sessions.id * 2 AS id,
+        activities.name AS activity_name,
+        datetime(start_ts, 'unixepoch', 'localtime') AS start_time,
+        NULL AS end_time,
+        'started' AS status,
+        datetime(start_ts, 'unixepoch', 'localtime') AS date_time
+    FROM sessions JOIN activities ON activities.id = sessions.activity_id
+    UNION ALL
+    SELECT sessions.id * 2 + 1,
+        activities.name,
+        NULL,
+        datetime(end_ts, 'unixepoch', 'localtime'),
+        CASE status WHEN 1 THEN 'finished' WHEN 2 THEN 'cancelled' ELSE 'missing' END,
+        datetime(end_ts, 'unixepoch', 'localtime')
+    FROM sessions JOIN activities ON activities.id = sessions.activity_id
+    WHERE end_ts IS NOT NULL
+'''
+
+def migrate_v5_normalize_sessions(cursor):
+    # One row per session with integer epoch times and an activity id, instead
+    # of "started" and end rows that repeat the activity name and have to be
+    # paired again by every reader
+    cursor.execute('''
+        CREATE TABLE sessions (
+            id INTEGER PRIMARY KEY,
+            activity_id INTEGER NOT NULL REFERENCES activities (id),
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER,
+            status INTEGER NOT NULL
+        )
+    ''')
+
+    # Every logged activity needs an id, including the unnamed one
+    cursor.execute('INSERT OR IGNORE INTO activities (name) SELECT DISTINCT activity_name FROM timer_logs')
+    activity_ids = dict(cursor.execute('SELECT name, id FROM activities').fetchall())
+
+    # Pair each "started" row with the next end row of the same activity. Ids
+    # are given out at the start, so sessions keep their chronological order.
+    def to_ts(time_str):
+        return int(datetime.datetime.fromisoformat(time_str).timestamp())
+
+    # Older versions logged an end under whatever the activity entry held at
+    # the time, so an end can name another activity than its start. They ran
+    # one timer at a time: such an end closes the one session open, if any.
+    # Rows that still pair with nothing are kept in timer_logs_unmatched.
+    cursor.execute('CREATE TABLE timer_logs_unmatched AS SELECT * FROM timer_logs WHERE 0')
+
+    reader = cursor.connection.cursor()
+    reader.execute('SELECT id, activity_name, start_time, end_time, status, date_time FROM timer_logs ORDER BY date_time, id')
+    open_sessions = {}  # activity_id -> (session id, start_ts)
+    next_id       = 0
+    batch         = []
+    unmatched     = []
+    for row in reader:
+        _, activity_name, start_time, end_time, status, _ = row
+        activity_id = activity_ids[activity_name]
+        if status == "started" and start_time:
+            if activity_id in open_sessions:
+                # Started again before it ended: the first one lost its end
+                session_id, start_ts = open_sessions.pop(activity_id)
+                batch.append((session_id, activity_id, start_ts, start_ts, SESSION_MISSING))
+            next_id += 1
+            open_sessions[activity_id] = (next_id, to_ts(start_time))
+        elif activity_id in open_sessions and end_time and status in SESSION_STATUSES:
+            session_id, start_ts = open_sessions.pop(activity_id)
+            batch.append((session_id, activity_id, start_ts, max(to_ts(end_time), start_ts), SESSION_STATUSES.index(status)))
+        elif len(open_sessions) == 1 and end_time and status in SESSION_STATUSES:
+            started_id, (session_id, start_ts) = open_sessions.popitem()
+            batch.append((session_id, started_id, start_ts, max(to_ts(end_time), start_ts), SESSION_STATUSES.index(status)))
+        else:
+            unmatched.append(row)
+
+        if len(batch) >= 50000:
+            cursor.executemany('INSERT INTO sessions (id, activity_id, start_ts, end_ts, status) VALUES (?, ?, ?, ?, ?)', batch)
+            batch = []
+    for activity_id, (session_id, start_ts) in open_sessions.items():
+        batch.append((session_id, activity_id, start_ts, None, SESSION_STARTED))
+    cursor.executemany('INSERT INTO sessions (id, activity_id, start_ts, end_ts, status) VALUES (?, ?, ?, ?, ?)', batch)
+    cursor.executemany('INSERT INTO timer_logs_unmatched VALUES (?, ?, ?, ?, ?, ?)', unmatched)
+
+    cursor.execute('CREATE INDEX idx_sessions_start_ts ON sessions (start_ts)')
+    cursor.execute('CREATE INDEX idx_sessions_activity_id ON sessions (activity_id, start_ts)')
+    # Only running sessions, so finding them stays cheap however long the history
+    cursor.execute('CREATE INDEX idx_sessions_open ON sessions (activity_id) WHERE end_ts IS NULL')
+
+    # The old event layout stays readable as a view
+    cursor.execute('DROP TABLE timer_logs')
+    cursor.execute(TIMER_LOGS_VIEW)
+
+    cursor.execute('DROP TABLE daily_totals')
+    cursor.execute('''
+        CREATE TABLE daily_totals (
+            day TEXT NOT NULL,
+            activity_id INTEGER NOT NULL REFERENCES activities (id),
+            seconds INTEGER NOT NULL,
+            sessions INTEGER NOT NULL,
+            first_start INTEGER,
+            last_end INTEGER,
+            PRIMARY KEY (day, activity_id)
+        ) WITHOUT ROWID
+    ''')
+    backfill_daily_totals(cursor)
+
+    # Open sessions are found through idx_sessions_open now, not a watermark
+    cursor.execute("DELETE FROM meta WHERE key LIKE 'repair_watermark_%'")
+    active = cursor.execute("SELECT value FROM meta WHERE key = 'active_session'").fetchone()
+    if active:
+        state = json.loads(active[0])
+        state["started_ts"] = to_ts(state.pop("started_at"))
+        cursor.execute("UPDATE meta SET value = ? WHERE key = 'active_session'", (json.dumps(state),))
+    cursor.execute('ANALYZE')
+
+def migrate_v6_add_devices(cursor):
+    # Other databases this one syncs with, and how far their changesets have
+    # been applied. Sessions copied from them keep their device, so they are
+    # not sent on as this device's own; device_id is NULL for local sessions.
+    cursor.execute('''
+        CREATE TABLE devices (
+            id INTEGER PRIMARY KEY,
+            uuid TEXT NOT NULL UNIQUE,
+            last_sequence INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('ALTER TABLE sessions ADD COLUMN device_id INTEGER REFERENCES devices (id)')
+
+def migrate_v7_autoincrement_session_ids(cursor):
+    # Session ids never come back: without AUTOINCREMENT, SQLite reuses the
+    # ids of the newest rows once they are archived, and sync, which sends the
+    # sessions above its sync_sent_session mark, would skip the new ones.
+    # Numbering resumes above every id given out so far, sent ones included.
+    cursor.execute('''
+        CREATE TABLE sessions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity_id INTEGER NOT NULL REFERENCES activities (id),
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER,
+            status INTEGER NOT NULL,
+            device_id INTEGER REFERENCES devices (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO sessions_new (id, activity_id, start_ts, end_ts, status, device_id)
+        SELECT id, activity_id, start_ts, end_ts, status, device_id FROM sessions
+    ''')
+    sent = cursor.execute("SELECT value FROM meta WHERE key = 'sync_sent_session'").fetchone()
+    floor = max(cursor.execute('SELECT MAX(id) FROM sessions').fetchone()[0] or 0, int(sent[0]) if sent else 0)
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'sessions_new'")
+    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('sessions_new', ?)", (floor,))
+
+    # The view names the table, so it goes while the table is swapped
+    cursor.execute('DROP VIEW timer_logs')
+    cursor.execute('DROP TABLE sessions')
+    cursor.execute('ALTER TABLE sessions_new RENAME TO sessions')
+    cursor.execute(TIMER_LOGS_VIEW)
+    cursor.execute('CREATE INDEX idx_sessions_start_ts ON sessions (start_ts)')
+    cursor.execute('CREATE INDEX idx_sessions_activity_id ON sessions (activity_id, start_ts)')
+    cursor.execute('CREATE INDEX idx_sessions_open ON sessions (activity_id) WHERE end_ts IS NULL')
+    cursor.execute('ANALYZE')
+
+MIGRATIONS = [
+    migrate_v1_create_tables,
+    migrate_v2_add_indexes,
+    migrate_v3_add_meta,
+    migrate_v4_add_daily_totals,
+    migrate_v5_normalize_sessions,
+    migrate_v6_add_devices,
+    migrate_v7_autoincrement_session_ids,
+]
+
+# Migrations that free a lot of space; the file is vacuumed after them
+COMPACTING_MIGRATIONS = {migrate_v5_normalize_sessions}
+
+def migrate_db(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > len(MIGRATIONS):
+        raise sqlite3.DatabaseError(f"db schema version {version} is newer than this program ({len(MIGRATIONS)})")
+
+    # Each migration runs in its own transaction together with the version bump,
+    # so an interrupted upgrade leaves the file at the last complete version
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            MIGRATIONS[target - 1](cursor)
+            cursor.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+
+    if any(migration in COMPACTING_MIGRATIONS for migration in MIGRATIONS[version:]):
+        conn.execute('VACUUM')
+
+
+class ActivityDatabase:
+    # All access to activities.db. Writes go through a DbWriter thread once
+    # start_writer() is called, and are applied synchronously before that.
+    def __init__(self, db_name='activities.db'):
+        self.db_name        = db_name
+        self.writer         = None
+        self.activity_index = ActivityIndex()
+        self.archive        = SessionArchive(archive_root(db_name))
+        self.create_db()
+        metrics.instrument(self, "db", (
+            "add_timer_log", "add_to_rollup", "set_meta", "search_activities", "check_and_fix_records",
+            "summary", "flush", "backfill_rollups", "import_sessions"
+        ))
+
+    def create_db(self):
+        self.conn    = sqlite3.connect(self.db_name)
+        self.cursor  = self.conn.cursor()
+        # Readers keep working while the writer thread commits
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        migrate_db(self.conn)
+
+    def start_writer(self):
+        self.writer = DbWriter(self.db_name)
+        self.writer.start()
+
+    def execute_write(self, sql, params=()):
+        if self.writer:
+            self.writer.execute(sql, params)
+        else:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def flush(self, timeout=None):
+        return self.writer.flush(timeout) if self.writer else True
+
+    def close(self):
+        # Commit everything still queued before the process exits
+        if self.writer and self.writer.is_alive():
+            self.writer.close()
+        self.writer = None
+        self.conn.close()
+
+    def add_activity_to_db(self, activity):
+        # OR IGNORE: the activity may already exist
+        self.execute_write('INSERT OR IGNORE INTO activities (name) VALUES (?)', (activity,))
+        if activity:
+            self.activity_index.add(activity)
+
+    def add_timer_log(self, activity_name, start_ts, end_ts, status):
+        # "started" opens a session; any other status closes the open session
+        # of that activity starting at start_ts, or the latest one when
+        # start_ts is None. Times are epoch seconds.
+        if status == "started":
+            self.execute_write('INSERT OR IGNORE INTO activities (name) VALUES (?)', (activity_name,))
+            self.execute_write('''
+                INSERT INTO sessions (activity_id, start_ts, end_ts, status)
+                VALUES ((SELECT id FROM activities WHERE name = ?), ?, NULL, ?)
+            ''', (activity_name, start_ts, SESSION_STARTED))
+        else:
+            self.execute_write('''
+                UPDATE sessions SET end_ts = ?1, status = ?2
+                WHERE id = (
+                    SELECT MAX(id) FROM sessions
+                    WHERE activity_id = (SELECT id FROM activities WHERE name = ?3)
+                    AND end_ts IS NULL AND (?4 IS NULL OR start_ts = ?4)
+                )
+            ''', (end_ts, SESSION_STATUSES.index(status), activity_name, start_ts))
+
+    def add_to_rollup(self, activity_name, start_ts, end_ts):
+        # Right after add_timer_log() closed the session: nothing is added if
+        # another process closed it first, and counted it then
+        for row in rollup_rows(activity_name, start_ts, end_ts):
+            self.execute_write(DAILY_TOTALS_UPSERT_CLOSED, row)
+
+    def closed_status(self, activity_name, start_ts):
+        # Status of the session of activity_name starting at start_ts once it
+        # has ended, else None (still open, or its start not committed yet)
+        row = self.conn.execute('''
+            SELECT sessions.status
+            FROM sessions JOIN activities ON activities.id = sessions.activity_id
+            WHERE activities.name = ? AND sessions.start_ts = ? AND sessions.end_ts IS NOT NULL
+        ''', (activity_name, start_ts)).fetchone()
+        return SESSION_STATUSES[row[0]] if row else None
+
+    def get_meta(self, key, default=None):
+        self.cursor.execute('SELECT value FROM meta WHERE key = ?', (key,))
+        row = self.cursor.fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.execute_write('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def delete_meta(self, key):
+        self.execute_write('DELETE FROM meta WHERE key = ?', (key,))
+
+    def active_sessions(self):
+        # {timer id: saved state} of the running timers, see TimerEngine.save_state
+        self.cursor.execute("SELECT key, value FROM meta WHERE key = 'active_session' OR key LIKE 'active_session:%'")
+        return {int(key.partition(':')[2] or 0): json.loads(value) for key, value in self.cursor.fetchall()}
+
+    def search_activities(self, query, limit=None):
+        return self.activity_index.search(query, limit)
+
+    def check_and_fix_records(self):
+        # Sessions left open by an earlier run lost their end (crash, power
+        # loss). Close them as missing, with no duration. Only the partial
+        # index of open sessions is read, so this does not grow with history.
+        active = {(state["activity"], state["started_ts"]) for state in self.active_sessions().values()}
+
+        self.cursor.execute('''
+            SELECT sessions.id, activities.name, sessions.start_ts
+            FROM sessions INDEXED BY idx_sessions_open
+            JOIN activities ON activities.id = sessions.activity_id
+            WHERE sessions.end_ts IS NULL
+        ''')
+        stale = [row for row in self.cursor.fetchall() if (row[1], row[2]) not in active]
+        if not stale:
+            return
+
+        # Close them and update the rollup in a single transaction
+        with self.conn:
+            self.conn.executemany('UPDATE sessions SET end_ts = start_ts, status = ? WHERE id = ?', [(SESSION_MISSING, row[0]) for row in stale])
+            for _, activity_name, start_ts in stale:
+                self.conn.executemany(DAILY_TOTALS_UPSERT, rollup_rows(activity_name, start_ts, start_ts))
+
+    def erase_missing_records(self):
+        # Delete sessions with status 'missing', then recount the rollup
+        self.execute_write('DELETE FROM sessions WHERE status = ?', (SESSION_MISSING,))
+        self.backfill_rollups()
+
+    def summary(self, first_day, last_day):
+        # (activity, seconds, first start, last end) per activity, from the daily rollup
+        self.cursor.execute(SUMMARY_SQL, (first_day.isoformat(), last_day.isoformat()))
+        return self.cursor.fetchall()
+
+    def open_reader(self):
+        # A separate read-only connection, for long reads that should not hold
+        # up the GUI or the writer. Usable from another thread.
+        uri = pathlib.Path(self.db_name).absolute().as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def backfill_rollups(self, first_day=None, last_day=None):
+        # Archived sessions are counted too, so their days keep their totals
+        self.flush()
+        range_start, range_end = day_bounds(first_day, last_day) if first_day else (None, None)
+        archived = self.archived_sessions(range_start and range_start - MAX_SESSION_SECONDS, range_end)
+        if archived is not None:
+            activity_ids = dict(self.conn.execute('SELECT name, id FROM activities').fetchall())
+            archived     = ((activity_ids[name], start_ts, end_ts) for name, start_ts, end_ts, _ in archived)
+        with self.conn:
+            return backfill_daily_totals(self.conn.cursor(), first_day, last_day, archived or ())
+
+    def archived_sessions(self, first_ts=None, last_ts=None, conn=None):
+        # (activity, start_ts, end_ts, status) of the archived sessions starting
+        # in [first_ts, last_ts), oldest first, or None when the range does not
+        # reach back into the archive. conn: a reader used on another thread.
+        row = (conn or self.conn).execute("SELECT value FROM meta WHERE key = 'archived_before'").fetchone()
+        archived_before = int(row[0]) if row else 0
+        if not archived_before or (first_ts is not None and first_ts >= archived_before):
+            return None
+        return (
+            (activity, start_ts, end_ts, SESSION_STATUSES.index(status))
+            for activity, start_ts, end_ts, status in self.archive.sessions(first_ts, last_ts)
+        )
+
+    def archive_sessions(self, older_than_days, now=None):
+        # Move the closed sessions of the months that ended older_than_days or
+        # more ago to the archive, then compact the file. Their daily_totals
+        # rows stay, so the summary of those days does not change. Sessions not
+        # sent to other devices yet stay until they are. Returns the number of
+        # sessions moved.
+        self.flush()
+        now    = time.time() if now is None else now
+        cutoff = month_start(month_of(now - older_than_days * 86400))
+        sql    = '''
+            SELECT sessions.id, activities.name, sessions.start_ts, sessions.end_ts, sessions.status
+            FROM sessions
+            JOIN activities ON activities.id = sessions.activity_id
+            WHERE sessions.start_ts >= ? AND sessions.start_ts < ? AND sessions.end_ts IS NOT NULL
+        '''
+        params = []
+        if self.get_meta('device_uuid'):
+            sql += ' AND (sessions.device_id IS NOT NULL OR sessions.id <= ?)'
+            params.append(int(self.get_meta('sync_sent_session', '0')))
+
+        # One month at a time: written to its file first, then deleted here
+        moved  = 0
+        oldest = self.conn.execute('SELECT MIN(start_ts) FROM sessions WHERE start_ts < ?', (cutoff,)).fetchone()[0]
+        month  = month_of(oldest) if oldest is not None else None
+        while month and month_start(month) < cutoff:
+            rows = self.conn.execute(sql, [month_start(month), month_start(next_month(month))] + params).fetchall()
+            if rows:
+                self.archive.write(month, ((name, start_ts, end_ts, SESSION_STATUSES[status]) for _, name, start_ts, end_ts, status in rows))
+                with self.conn:
+                    self.conn.executemany('DELETE FROM sessions WHERE id = ?', ((row[0],) for row in rows))
+                moved += len(rows)
+            month = next_month(month)
+
+        if cutoff > int(self.get_meta('archived_before', '0')):
+            self.set_meta('archived_before', str(cutoff))
+        if moved:
+            self.conn.execute('VACUUM')
+            self.conn.execute('ANALYZE')
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return moved
+
+    def archive_steps(self, older_than_days):
+        # archive_sessions() as QueryWorker steps, so the GUI can run it off the
+        # Tk thread. It writes, so it opens its own connection rather than use
+        # the worker's read-only one, and yields (None, sessions moved).
+        def steps(conn):
+            db = ActivityDatabase(self.db_name)
+            try:
+                yield None, db.archive_sessions(older_than_days)
+            finally:
+                db.close()
+        return steps
+
+    def import_sessions(self, sessions, chunk_size=100000, device_id=None):
+        # Bulk-load (activity_name, start_ts, end_ts, status) tuples. A session
+        # is skipped when the same activity already has one starting within two
+        # seconds, so importing the same data twice changes nothing. device_id
+        # marks sessions that were recorded on another device.
+        # Returns (sessions read, sessions inserted).
+        self.flush()
+        activity_ids = dict(self.conn.execute('SELECT name, id FROM activities').fetchall())
+        read         = 0
+        inserted     = 0
+        first_ts     = None
+        last_ts      = None
+
+        def flush_chunk(chunk):
+            before = self.conn.total_changes
+            with self.conn:
+                self.conn.executemany('''
+                    INSERT INTO sessions (activity_id, start_ts, end_ts, status, device_id)
+                    SELECT ?1, ?2, ?3, ?4, ?5
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM sessions
+                        WHERE activity_id = ?1 AND start_ts BETWEEN ?2 - 2 AND ?2 + 2
+                    )
+                ''', chunk)
+            return self.conn.total_changes - before
+
+        archived_before = int(self.get_meta('archived_before', '0'))
+        chunk = []
+        for activity_name, start_ts, end_ts, status in sessions:
+            # Sessions moved to the archive are not in the table to be found there
+            if start_ts - 2 < archived_before and self.archive.contains(activity_name, start_ts, slack=2):
+                read += 1
+                continue
+            if activity_name not in activity_ids:
+                with self.conn:
+                    self.conn.execute('INSERT OR IGNORE INTO activities (name) VALUES (?)', (activity_name,))
+                activity_ids[activity_name] = self.conn.execute('SELECT id FROM activities WHERE name = ?', (activity_name,)).fetchone()[0]
+                if activity_name:
+                    self.activity_index.add(activity_name)
+
+            chunk.append((activity_ids[activity_name], start_ts, end_ts, SESSION_STATUSES.index(status), device_id))
+            read    += 1
+            first_ts = start_ts if first_ts is None else min(first_ts, start_ts)
+            last_ts  = max(last_ts or 0, end_ts if end_ts is not None else start_ts)
+            if len(chunk) >= chunk_size:
+                inserted += flush_chunk(chunk)
+                chunk = []
+        inserted += flush_chunk(chunk)
+
+        # Recount only the days the imported sessions cover
+        if inserted:
+            self.backfill_rollups(datetime.date.fromtimestamp(first_ts), datetime.date.fromtimestamp(last_ts))
+        return read, inserted
+
+
+class SummaryModel:
+    # Rows of the summary table. Each row keeps typed sort keys next to its
+    # display strings, so sorting never parses what is shown.
+    COLUMNS = ("Activity", "Cumulative Time", "Start Time", "End Time")
+
+    def __init__(self, rows=()):
+        self.rows = []  # ((sort keys), (display values))
+        self.add_rows(rows)
+
+    def add_rows(self, rows):
+        for activity_name, seconds, first_start, last_end in rows:
+            self.rows.append((
+                (activity_name.lower(), seconds, first_start or 0, last_end or 0),
+                (activity_name, format_duration(seconds), format_timestamp(first_start), format_timestamp(last_end)),
+            ))
+
+    def sort(self, column, descending=False):
+        index = self.COLUMNS.index(column)
+        self.rows.sort(key=lambda row: row[0][index], reverse=descending)
+
+    def values(self, index):
+        return self.rows[index][1]
+
+    def __len__(self):
+        return len(self.rows)
+
+class PeriodSummaryModel(SummaryModel):
+    # Summary rows per hour, day or week, see pomodoro_intervals.period_rows()
+    COLUMNS = ("Period",) + SummaryModel.COLUMNS
+
+    def add_rows(self, rows):
+        for bucket_start, label, activity_name, seconds, first_start, last_end in rows:
+            self.rows.append((
+                (bucket_start, activity_name.lower(), seconds, first_start or 0, last_end or 0),
+                (label, activity_name, format_duration(seconds), format_timestamp(first_start), format_timestamp(last_end)),
+            ))
+
+
+class SystemClock:
+    # Where timers read the time. now() is the local wall clock as a datetime,
+    # time() the same as epoch seconds, and monotonic() never jumps; deadlines
+    # use it. pomodoro_replay.VirtualClock stands in for it to run timers in
+    # virtual time.
+    def now(self):
+        return datetime.datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class TimerEngine:
+    # Timer state machine: initial -> started -> cancelled | finished.
+    #
+    # The running session is saved in the meta table, so a timer started from
+    # one process (the CLI) can be checked or stopped from another (the GUI).
+    # Callbacks receive the engine and let a front end react to transitions.
+    # timer_id tells concurrent timers apart, see TimerScheduler.
+    def __init__(self, db, timer_id=0, clock=SYSTEM_CLOCK):
+        self.db             = db
+        self.clock          = clock
+        self.timer_id       = timer_id
+        self.state_key      = f'active_session:{timer_id}' if timer_id else 'active_session'
+        self.cycle          = None  # Work/break cycle this timer is a phase of
+        self.status         = "initial"
+        self.activity       = ""
+        self.started_ts     = None  # Epoch seconds
+        self.ends_at        = None  # Wall-clock end, as a datetime
+        self.deadline       = 0.0   # clock.monotonic() at which the timer ends
+        self.total_duration = 0
+        self.remaining_time = None  # Last whole seconds reported by tick()
+        self.notify_time    = 0
+        self.notified       = True
+        self.end_error_ms   = None  # Lateness of the last finish, for diagnostics
+        self.on_status      = None
+        self.on_notify      = None
+        self.on_finish      = None
+
+    @property
+    def running(self):
+        return self.status == "started"
+
+    def set_status(self, new_status, event_ts=None):
+        # event_ts: when the change happened (a start in the past, a scheduled end)
+        self.status = new_status
+        log_event(new_status, self.activity, event_ts)
+        if self.on_status:
+            self.on_status(self)
+
+    def start(self, activity, duration, notify_before=0, start=None):
+        # start: wall-clock start as a datetime, now by default. A timer started
+        # in the past ends early, or at once if its end already passed.
+        if self.running:
+            raise RuntimeError(f"A timer is already running for '{self.activity}'")
+
+        # Add activity to database when timer starts
+        activity = activity.strip()
+        if activity:
+            self.db.add_activity_to_db(activity)
+
+        now             = self.clock.now().replace(microsecond=0)
+        start           = start or now
+        self.started_ts = int(start.timestamp())
+        self.db.add_timer_log(activity, self.started_ts, None, "started")
+        if activity:
+            self.db.activity_index.record_use(activity, self.started_ts)
+
+        self.activity       = activity
+        self.total_duration = int(duration)
+        self.ends_at        = start + datetime.timedelta(seconds=duration)
+        remaining           = (self.ends_at - now).total_seconds()
+        self.deadline       = self.clock.monotonic() + remaining
+        self.remaining_time = None
+        self.notify_time    = notify_before
+        self.notified       = not 0 < notify_before <= remaining
+        self.save_state()
+        self.set_status("started", self.started_ts)
+
+    def remaining(self):
+        return self.deadline - self.clock.monotonic()
+
+    def tick(self):
+        # Recompute the remaining time from the deadline, so a late tick is
+        # corrected on the next one instead of pushing the end time back.
+        # Returns True when the displayed seconds changed.
+        if not self.running:
+            return False
+
+        remaining = self.remaining()
+        if remaining <= 0:
+            self.end_error_ms = -remaining * 1000
+            self.finish()
+            return True
+
+        seconds = math.ceil(remaining)
+        changed = seconds != self.remaining_time
+        if metrics.ENABLED:
+            # Ticks are due just after a second boundary; how far past it this one ran
+            metrics.record("tick.jitter", seconds - remaining)
+        self.remaining_time = seconds
+
+        if not self.notified and seconds <= self.notify_time:
+            self.notified = True
+            if self.on_notify:
+                self.on_notify(self)
+        return changed
+
+    def next_tick_ms(self):
+        # Just after the displayed second changes, or at the deadline
+        remaining = self.remaining()
+        if remaining <= 0:
+            return 0
+        return math.ceil((remaining - (math.ceil(remaining) - 1)) * 1000)
+
+    def stop(self):
+        if not self.running:
+            return
+        if self.remaining() <= 0:
+            self.finish()
+        else:
+            self.end("cancelled", self.clock.now())
+
+    def finish(self):
+        self.end("finished", self.ends_at)
+
+    def end(self, status, end):
+        # A session already closed was ended by another process (the CLI),
+        # which logged the end and counted the time: only let go of it here.
+        # Only committed rows are read, so this never waits for the writer;
+        # the guarded UPDATE and rollup cover an end committed meanwhile.
+        closed = self.db.closed_status(self.activity, self.started_ts)
+        if closed:
+            self.remaining_time = 0
+            self.status         = closed
+            if self.on_status:
+                self.on_status(self)
+            return
+
+        end_ts = int(end.timestamp())
+        self.db.add_timer_log(self.activity, self.started_ts, end_ts, status)
+        self.db.add_to_rollup(self.activity, self.started_ts, end_ts)
+        self.remaining_time = 0
+        self.db.delete_meta(self.state_key)
+        self.set_status(status, end_ts)
+        if status == "finished" and self.on_finish:
+            self.on_finish(self)
+
+    def save_state(self):
+        self.db.set_meta(self.state_key, json.dumps({
+            "activity":       self.activity,
+            "started_ts":     self.started_ts,
+            "ends_at":        self.ends_at.timestamp(),
+            "total_duration": self.total_duration,
+            "notify_time":    self.notify_time,
+            "cycle":          self.cycle,
+        }))
+
+    def restore(self):
+        # Pick up a session saved by this or another process. A session whose
+        # end already passed is logged as finished at its scheduled end.
+        state = json.loads(self.db.get_meta(self.state_key, 'null'))
+        if not state:
+            return False
+
+        self.activity       = state["activity"]
+        self.started_ts     = state["started_ts"]
+        self.ends_at        = datetime.datetime.fromtimestamp(state["ends_at"])
+        self.total_duration = state["total_duration"]
+        self.notify_time    = state["notify_time"]
+        self.cycle          = state.get("cycle")
+        self.status         = "started"
+
+        remaining           = state["ends_at"] - self.clock.time()
+        self.deadline       = self.clock.monotonic() + remaining
+        self.remaining_time = None
+        self.notified       = not 0 < self.notify_time < remaining
+        if remaining <= 0:
+            self.finish()
+            return False
+        return True
+
+
+def break_name(activity):
+    return f"{activity} (break)" if activity else "Break"
+
+class TimerScheduler:
+    # Any number of concurrent TimerEngines. Every pending end and reminder is
+    # an entry (monotonic due time, sequence, engine, started_ts, kind) in one
+    # heap; a front end calls run_due() when the earliest entry is due and
+    # otherwise sleeps until next_due(), so there is a single wake-up however
+    # many timers run. Entries of timers stopped early are dropped lazily.
+    #
+    # A work/break cycle is a chain of timers: when a phase finishes, the next
+    # one starts at its scheduled end, so phases keep their times even when
+    # nobody was around to see the previous one end. Stopping a phase with
+    # engine.stop() ends the cycle.
+    #
+    # The monotonic clock stands still while the machine sleeps (on Linux and
+    # macOS), the wall clock does not. Timers end at a wall-clock time, so
+    # run_due() moves every deadline by the gap when the two clocks drift apart.
+    def __init__(self, db, clock=SYSTEM_CLOCK):
+        self.db        = db
+        self.clock     = clock
+        self.offset    = clock.time() - clock.monotonic()
+        self.timers    = {}  # timer id -> running TimerEngine
+        self.heap      = []
+        self.sequence  = itertools.count()
+        self.on_status = None
+        self.on_notify = None
+        self.on_finish = None
+
+    @property
+    def running(self):
+        # Soonest to end first
+        return sorted(self.timers.values(), key=lambda engine: engine.deadline)
+
+    def find(self, activity):
+        activity = activity.strip()
+        for engine in self.timers.values():
+            if engine.activity == activity:
+                return engine
+        return None
+
+    def new_engine(self, timer_id):
+        engine           = TimerEngine(self.db, timer_id, self.clock)
+        engine.on_status = self.status_changed
+        engine.on_notify = self.notify
+        engine.on_finish = self.finished
+        self.timers[timer_id] = engine
+        return engine
+
+    def start(self, activity, duration, notify_before=0, start=None, cycle=None):
+        # One timer per activity: ends are logged against the activity's open session
+        if self.find(activity):
+            raise RuntimeError(f"A timer is already running for '{activity.strip()}'")
+
+        # Ids saved by another process (a CLI start) are taken as well, or this
+        # timer's state would overwrite that one's
+        taken        = set(self.timers) | set(self.db.active_sessions())
+        timer_id     = next(i for i in itertools.count() if i not in taken)
+        engine       = self.new_engine(timer_id)
+        engine.cycle = cycle
+        try:
+            engine.start(activity, duration, notify_before, start)
+        except:
+            del self.timers[timer_id]
+            raise
+        self.push(engine)
+        return engine
+
+    def start_cycle(self, activity, work=25 * 60, short_break=5 * 60, long_break=15 * 60, rounds=4, notify_before=0):
+        # rounds work phases with a short break after each, the last one long
+        cycle = {
+            "activity":      activity.strip(),
+            "work":          work,
+            "short_break":   short_break,
+            "long_break":    long_break,
+            "rounds":        rounds,
+            "notify_before": notify_before,
+            "phase":         0,
+        }
+        return self.start_phase(cycle)
+
+    def start_phase(self, cycle, start=None):
+        phase = cycle["phase"]
+        if phase % 2 == 0:
+            activity, duration = cycle["activity"], cycle["work"]
+        else:
+            last     = phase // 2 + 1 == cycle["rounds"]
+            activity = break_name(cycle["activity"])
+            duration = cycle["long_break"] if last else cycle["short_break"]
+        return self.start(activity, duration, cycle["notify_before"], start, cycle)
+
+    def push(self, engine):
+        heapq.heappush(self.heap, (engine.deadline, next(self.sequence), engine, engine.started_ts, "end"))
+        if not engine.notified:
+            due = engine.deadline - engine.notify_time
+            heapq.heappush(self.heap, (due, next(self.sequence), engine, engine.started_ts, "notify"))
+
+    def live(self, entry):
+        _, _, engine, started_ts, kind = entry
+        return engine.running and engine.started_ts == started_ts and (kind == "end" or not engine.notified)
+
+    def next_due(self):
+        # Seconds until the earliest pending entry, None when nothing runs
+        while self.heap and not self.live(self.heap[0]):
+            heapq.heappop(self.heap)
+        return max(self.heap[0][0] - self.clock.monotonic(), 0.0) if self.heap else None
+
+    def next_due_ms(self):
+        due = self.next_due()
+        return None if due is None else math.ceil(due * 1000)
+
+    def resync(self):
+        # After a suspend (or a clock change) of more than a second, move the
+        # deadlines so they match the wall-clock ends again
+        offset = self.clock.time() - self.clock.monotonic()
+        shift  = offset - self.offset
+        if abs(shift) > 1:
+            for engine in self.timers.values():
+                engine.deadline -= shift
+            self.heap = [(due - shift,) + tuple(entry) for due, *entry in self.heap]
+        self.offset = offset
+
+    def run_due(self, now=None):
+        # Fire every entry due by now; returns how many fired
+        self.resync()
+        now   = self.clock.monotonic() if now is None else now
+        fired = 0
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if not self.live(entry):
+                continue
+            due, _, engine, _, kind = entry
+            fired += 1
+            if kind == "notify":
+                engine.notified = True
+                self.notify(engine)
+            else:
+                engine.end_error_ms = (now - due) * 1000
+                engine.finish()
+        return fired
+
+    def status_changed(self, engine):
+        if not engine.running:
+            self.timers.pop(engine.timer_id, None)
+        if self.on_status:
+            self.on_status(engine)
+
+    def notify(self, engine):
+        if self.on_notify:
+            self.on_notify(engine)
+
+    def finished(self, engine):
+        if self.on_finish:
+            self.on_finish(engine)
+        cycle = engine.cycle
+        if cycle and cycle["phase"] + 1 < cycle["rounds"] * 2:
+            self.start_phase(dict(cycle, phase=cycle["phase"] + 1), engine.ends_at)
+
+    def restore(self):
+        # Pick up the timers saved by this or another process. Those whose end
+        # passed are finished at their scheduled end, and their cycles carried
+        # on. Returns the timers still running.
+        for timer_id in sorted(self.db.active_sessions()):
+            if timer_id in self.timers:
+                continue
+            engine = self.new_engine(timer_id)
+            if engine.restore():
+                self.push(engine)
+            elif self.timers.get(timer_id) is engine:
+                del self.timers[timer_id]
+        self.run_due()
+        return self.running
+
+
+class TimerDriver:
+    # The wake-up loop of a front end, on an after(ms, callback) and
+    # after_cancel(id) pair: Tk's in the GUI, VirtualClock's in
+    # pomodoro_replay. One chain of calls for every timer: wakeup() fires the
+    # due ends and reminders, ticks the timer on show and sleeps until the
+    # sooner of the next due entry and that timer's next second. When the
+    # timer on show stops, the newest running one is shown instead.
+    def __init__(self, scheduler, after, after_cancel):
+        self.scheduler    = scheduler
+        self.after        = after
+        self.after_cancel = after_cancel
+        self.after_id     = None
+        self.shown        = None
+        self.on_focus     = None  # Called with the timer put on show
+        self.on_tick      = None  # Called with the timer on show when its displayed second changes
+
+    def focus(self, engine):
+        self.shown = engine
+        engine.remaining_time = None  # Redraw on the next wake-up
+        if self.on_focus:
+            self.on_focus(engine)
+
+    def wakeup(self):
+        # Also called right after a timer is started or stopped, to reschedule
+        self.cancel()
+        self.scheduler.run_due()
+
+        running = self.scheduler.running
+        if running and not (self.shown and self.shown.running):
+            self.focus(max(running, key=lambda engine: engine.started_ts))
+
+        delays = [self.scheduler.next_due_ms()]
+        # tick() only redraws here: ends and reminders already fired above
+        shown = self.shown
+        if shown and shown.running and shown.tick() and shown.running and self.on_tick:
+            self.on_tick(shown)
+        if shown and shown.running:
+            delays.append(shown.next_tick_ms())
+
+        delays = [delay for delay in delays if delay is not None]
+        if delays:
+            self.after_id = self.after(min(delays), self.wakeup)
+
+    def cancel(self):
+        if self.after_id:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+
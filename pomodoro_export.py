@@ -0,0 +1,160 @@
+###########################################################################################
+#                                                                                         #
+# Export of the session history.                                                          #
+#                                                                                         #
+# Sessions are read from a read-only connection in chunks and written as they arrive,     #
+# so the memory used does not depend on the number of rows. Three formats:                #
+#                                                                                         #
+#   .csv    activity, start, end, status, seconds (local time, one header line)           #
+#   .jsonl  one JSON object per session, times as epoch seconds                           #
+#   .pcol   compact binary columns, see write_columnar() and read_columnar()              #
+#                                                                                         #
+###########################################################################################
+
+
+import array
+import csv
+import json
+import os
+import struct
+import sys
+
+from pomodoro_engine import SESSION_STATUSES, day_bounds, format_timestamp, iter_sessions
+
+
+CSV_COLUMNS = ("activity", "start", "end", "status", "seconds")
+
+# Binary columnar file: the magic, then one block per chunk until EOF
+COLUMNAR_MAGIC  = b"POMOCOL1"
+COLUMNAR_HEADER = struct.Struct("<II")  # rows in the block, activity names new in the block
+COLUMNAR_NAME   = struct.Struct("<H")   # byte length of a UTF-8 name
+NO_END          = -1                    # end column value of sessions still open
+
+
+def write_csv(chunks, f):
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(
+            (activity, format_timestamp(start_ts), format_timestamp(end_ts), SESSION_STATUSES[status],
+             end_ts - start_ts if end_ts is not None else "")
+            for activity, start_ts, end_ts, status in chunk
+        )
+        rows += len(chunk)
+    return rows
+
+def write_jsonl(chunks, f):
+    rows = 0
+    for chunk in chunks:
+        f.writelines(
+            json.dumps({"activity": activity, "start": start_ts, "end": end_ts, "status": SESSION_STATUSES[status]},
+                       ensure_ascii=False) + "\n"
+            for activity, start_ts, end_ts, status in chunk
+        )
+        rows += len(chunk)
+    return rows
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def write_columnar(chunks, f):
+    # Each block holds the activity names first seen in it, then four columns:
+    # activity (uint32, index into all names so far), start (int64), end
+    # (int64, NO_END when open) and status (uint8, index into SESSION_STATUSES)
+    f.write(COLUMNAR_MAGIC)
+    name_ids = {}
+    rows     = 0
+    for chunk in chunks:
+        new_names = []
+        ids       = array.array("I")
+        for activity, _, _, _ in chunk:
+            name_id = name_ids.get(activity)
+            if name_id is None:
+                name_id = name_ids[activity] = len(name_ids)
+                new_names.append(activity)
+            ids.append(name_id)
+
+        f.write(COLUMNAR_HEADER.pack(len(chunk), len(new_names)))
+        for name in new_names:
+            encoded = name.encode("utf-8")
+            f.write(COLUMNAR_NAME.pack(len(encoded)) + encoded)
+        f.write(little_endian(ids))
+        f.write(little_endian(array.array("q", (row[1] for row in chunk))))
+        f.write(little_endian(array.array("q", (NO_END if row[2] is None else row[2] for row in chunk))))
+        f.write(bytes(row[3] for row in chunk))
+        rows += len(chunk)
+    return rows
+
+def read_columnar(f):
+    # Yield (activity, start_ts, end_ts, status) back from a .pcol file
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a Pomodoro columnar export")
+    names = []
+    while True:
+        header = f.read(COLUMNAR_HEADER.size)
+        if not header:
+            return
+        rows, new_names = COLUMNAR_HEADER.unpack(header)
+        for _ in range(new_names):
+            length, = COLUMNAR_NAME.unpack(f.read(COLUMNAR_NAME.size))
+            names.append(f.read(length).decode("utf-8"))
+
+        columns = []
+        for typecode in ("I", "q", "q"):
+            values = array.array(typecode)
+            values.frombytes(f.read(rows * values.itemsize))
+            if sys.byteorder == "big":
+                values.byteswap()
+            columns.append(values)
+        statuses = f.read(rows)
+
+        for name_id, start_ts, end_ts, status in zip(*columns, statuses):
+            yield names[name_id], start_ts, None if end_ts == NO_END else end_ts, SESSION_STATUSES[status]
+
+
+# Format name -> (file extension, writer, binary)
+FORMATS = {
+    "csv":   (".csv",   write_csv,      False),
+    "jsonl": (".jsonl", write_jsonl,    False),
+    "pcol":  (".pcol",  write_columnar, True),
+}
+
+def format_for_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    for name, (format_extension, _, _) in FORMATS.items():
+        if extension == format_extension:
+            return name
+    raise ValueError(f"Unknown export format '{extension}', use one of: {', '.join(FORMATS)}")
+
+def export_sessions(db, path, first_day, last_day, activity=None, fmt=None, chunk_size=10000):
+    # Write the sessions started between first_day and last_day (None: no
+    # limit) to path and return the number of rows. The file only appears
+    # once it is complete. Archived sessions of the range are included.
+    fmt = fmt or format_for_path(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', use one of: {', '.join(FORMATS)}")
+    _, writer, binary = FORMATS[fmt]
+
+    db.flush()
+    conn     = db.open_reader()
+    tmp_path = path + ".part"
+    try:
+        first_ts = day_bounds(first_day, first_day)[0] if first_day else None
+        last_ts  = day_bounds(last_day, last_day)[1] if last_day else None
+        archived = db.archived_sessions(first_ts, last_ts, conn)
+        chunks   = iter_sessions(conn, first_day, last_day, activity, chunk_size, archived)
+        if binary:
+            with open(tmp_path, "wb", buffering=1024 * 1024) as f:
+                rows = writer(chunks, f)
+        else:
+            with open(tmp_path, "w", encoding="utf-8", newline="", buffering=1024 * 1024) as f:
+                rows = writer(chunks, f)
+        os.replace(tmp_path, path)
+    finally:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
@@ -0,0 +1,208 @@
+###########################################################################################
+#                                                                                         #
+# Session time per hour, day or week, from the sessions themselves.                       #
+#                                                                                         #
+# Every session is one interval. A single sweep over the interval ends and the bucket     #
+# boundaries clips each session to the buckets it touches, so a session crossing midnight #
+# or a week boundary is split between them:                                               #
+#                                                                                         #
+#   per bucket and activity  seconds, sessions started, first start, last end             #
+#   per bucket               seconds with any timer running, concurrent timers once       #
+#                                                                                         #
+# Sessions of one activity that overlap (imported or synced from two devices) are         #
+# counted once. Sessions that lost their end have no length; running ones last until now. #
+# Ranges reaching back before the archive horizon read the archived sessions too.         #
+#                                                                                         #
+###########################################################################################
+
+
+import datetime
+import heapq
+import itertools
+import time
+
+from pomodoro_engine import MAX_SESSION_SECONDS, day_bounds
+
+
+BUCKET_UNITS = ("hour", "day", "week")
+
+# Event kinds, in the order they are handled when they fall on the same second.
+# A boundary comes first, so a session starting at midnight belongs to the new day,
+# and ends come last, so a session without length opens before it closes.
+BOUNDARY = 0
+START    = 1
+END      = 2
+
+
+def bucket_bounds(first_day, last_day, unit):
+    # Epoch seconds of the local start of every hour, day or week (from Monday)
+    # from first_day to the end of last_day, plus that end. The first and last
+    # week are cut at the range. Hours follow the clock: a day with a DST change
+    # has 23 or 25 of them.
+    if unit not in BUCKET_UNITS:
+        raise ValueError(f"Unknown bucket '{unit}', use one of: {', '.join(BUCKET_UNITS)}")
+    range_start, range_end = day_bounds(first_day, last_day)
+    bounds = []
+    day    = first_day
+    while day <= last_day:
+        day_start, day_end = day_bounds(day, day)
+        if unit == "hour":
+            bounds.extend(range(day_start, day_end, 3600))
+        elif unit == "day" or day.weekday() == 0 or day == first_day:
+            bounds.append(day_start)
+        day += datetime.timedelta(days=1)
+    bounds.append(range_end)
+    return bounds
+
+def bucket_label(ts, unit):
+    start = datetime.datetime.fromtimestamp(ts)
+    if unit == "hour":
+        return start.strftime("%Y-%m-%d %H:00")
+    if unit == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    return start.date().isoformat()
+
+def load_intervals(conn, range_start, range_end, running=(), now=None):
+    # (activity, start, end) of the sessions overlapping [range_start, range_end),
+    # by start. running holds the (activity, start) of the running timers, whose
+    # open sessions end at now; other open sessions lost their end and end at
+    # their start.
+    running = set(running)
+    cursor  = conn.execute('''
+        SELECT activities.name, sessions.start_ts, sessions.end_ts
+        FROM sessions
+        JOIN activities ON activities.id = sessions.activity_id
+        WHERE sessions.start_ts >= ? AND sessions.start_ts < ?
+        ORDER BY sessions.start_ts
+    ''', (range_start - MAX_SESSION_SECONDS, range_end))
+    for activity, start_ts, end_ts in cursor:
+        if end_ts is None:
+            end_ts = max(now, start_ts) if now and (activity, start_ts) in running else start_ts
+        if end_ts > range_start or start_ts >= range_start:
+            yield activity, start_ts, end_ts
+
+def sweep(intervals, bounds):
+    # Clip intervals (key, start, end), ordered by start, to the buckets
+    # [bounds[i], bounds[i + 1]) and yield (i, totals, busy) for each bucket
+    # once the sweep passes its end: totals is {key: [seconds, sessions, first
+    # start, last end]} and busy the seconds during which any interval was
+    # open. A session counts in the bucket it starts in; first start and last
+    # end are clipped to the bucket. Starts and boundaries are merged as they
+    # come and ends wait in a heap, so nothing is sorted up front: O(n log k)
+    # for k intervals open at once.
+    starts = ((start, START, key, max(start, end)) for key, start, end in intervals)
+    events = heapq.merge(((ts, BOUNDARY, None, None) for ts in bounds), starts)
+    ends   = []  # Heap of (end, key) of the open intervals
+
+    buckets = len(bounds) - 1
+    totals  = {}
+    busy    = 0
+    active  = {}  # key -> intervals open
+    bucket  = -1  # Before the first boundary
+    last_ts = None
+    for ts, kind, key, end in itertools.chain(events, [(None, END, None, None)]):
+        # Ends due before this event (or all of them after the last one)
+        while ends and (ts is None or ends[0][0] < ts):
+            end_ts, end_key = heapq.heappop(ends)
+            if 0 <= bucket < buckets and end_ts > last_ts:
+                busy = accumulate(totals, active, last_ts, end_ts, busy)
+            last_ts = end_ts
+            active[end_key] -= 1
+            if not active[end_key]:
+                del active[end_key]
+        if ts is None:
+            break
+
+        if active and 0 <= bucket < buckets and ts > last_ts:
+            busy = accumulate(totals, active, last_ts, ts, busy)
+        last_ts = ts
+
+        if kind == BOUNDARY:
+            if bucket >= 0:
+                yield bucket, totals, busy
+            bucket += 1
+            totals  = {}
+            busy    = 0
+        else:
+            active[key] = active.get(key, 0) + 1
+            heapq.heappush(ends, (end, key))
+            if 0 <= bucket < buckets:
+                total = totals.get(key)
+                if total:
+                    total[1] += 1
+                    total[3]  = max(total[3], ts)
+                else:
+                    totals[key] = [0, 1, ts, ts]
+
+def accumulate(totals, active, start, end, busy):
+    # Add [start, end) to the open keys of a bucket; returns its new busy seconds
+    for key in active:
+        total = totals.get(key)
+        if total:
+            total[0] += end - start
+            total[3]  = end
+        else:
+            totals[key] = [end - start, 0, start, end]
+    return busy + end - start
+
+def running_sessions(db):
+    # (activity, start) of the running timers, for load_intervals()
+    return [(state["activity"], state["started_ts"]) for state in db.active_sessions().values()]
+
+def period_summary_steps(db, conn, first_day, last_day, unit, running=(), now=None, chunk_size=500):
+    # summarize() in steps, for a QueryWorker reading through conn: yields
+    # (progress from 0 to 1, buckets) with the buckets completed since the
+    # previous step. Sessions stream from the cursor into the sweep, so the
+    # memory used does not depend on the length of the range.
+    now       = time.time() if now is None else now
+    bounds    = bucket_bounds(first_day, last_day, unit)
+    intervals = load_intervals(conn, bounds[0], bounds[-1], running, int(now))
+    archived  = db.archived_sessions(bounds[0] - MAX_SESSION_SECONDS, bounds[-1], conn)
+    if archived is not None:
+        archived  = (
+            (activity, start_ts, end_ts) for activity, start_ts, end_ts, _ in archived
+            if end_ts > bounds[0] or start_ts >= bounds[0]
+        )
+        intervals = heapq.merge(intervals, archived, key=lambda interval: interval[1])
+
+    chunk = []
+    for i, totals, busy in sweep(intervals, bounds):
+        if totals:
+            chunk.append((
+                bounds[i], bucket_label(bounds[i], unit),
+                [(activity, seconds, sessions, first_start, last_end)
+                 for activity, (seconds, sessions, first_start, last_end) in sorted(totals.items())],
+                busy
+            ))
+        if len(chunk) >= chunk_size or i % chunk_size == 0:
+            yield (i + 1) / (len(bounds) - 1), chunk
+            chunk = []
+    yield 1.0, chunk
+
+def summarize(db, first_day, last_day, unit, now=None):
+    # [(bucket start, label, rows, busy seconds)] from first_day to last_day, one
+    # entry per bucket with sessions. rows are (activity, seconds, sessions,
+    # first start, last end), as db.summary() returns them plus the count.
+    db.flush()
+    buckets = []
+    for _, chunk in period_summary_steps(db, db.conn, first_day, last_day, unit, running_sessions(db), now):
+        buckets.extend(chunk)
+    return buckets
+
+# Activity of the per-bucket row that counts concurrent timers once
+ALL_ACTIVITIES = "All activities"
+
+def period_rows(buckets):
+    # Flatten summarize() into (bucket start, label, activity, seconds, first
+    # start, last end) rows for PeriodSummaryModel. Buckets with several
+    # activities get an ALL_ACTIVITIES row with the busy seconds.
+    rows = []
+    for bucket_start, label, activities, busy in buckets:
+        for activity, seconds, _, first_start, last_end in activities:
+            rows.append((bucket_start, label, activity, seconds, first_start, last_end))
+        if len(activities) > 1:
+            first_start = min(row[3] for row in activities)
+            last_end    = max(row[4] for row in activities)
+            rows.append((bucket_start, label, ALL_ACTIVITIES, busy, first_start, last_end))
+    return rows
@@ -0,0 +1,154 @@
+###########################################################################################
+#                                                                                         #
+# Event log for the Pomodoro timer.                                                       #
+#                                                                                         #
+# Every status change is written as one CSV line, "date time, status, activity", stamped  #
+# with the time of the event (a timer that ended while the program was closed is logged   #
+# at its end, not at the next start). The timer only puts records on a queue; a listener  #
+# thread writes them to pomodoro.csv, which rotates by size, or by date when              #
+# POMODORO_LOG_ROTATE is set ("midnight", "W0", ...), into gzip-compressed segments:      #
+#                                                                                         #
+#   pomodoro.csv  pomodoro.csv.1.gz  pomodoro.csv.2.gz  ...                               #
+#                                                                                         #
+# import_logs() reads those files back and bulk-loads the sessions into a database.       #
+#                                                                                         #
+###########################################################################################
+
+
+import atexit
+import datetime
+import glob
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+
+LOG_FORMAT      = '%(asctime)s, %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+NO_ACTIVITY     = 'No activity'
+LOG_ROTATE_ENV  = 'POMODORO_LOG_ROTATE'  # TimedRotatingFileHandler `when`, for date rotation
+
+# The listener that owns the file handler, once configure_logging() ran
+log_listener = None
+
+
+def gzip_namer(name):
+    return name + ".gz"
+
+def gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+class EventFormatter(logging.Formatter):
+    # asctime is the time of the event when the record carries one (event_ts,
+    # epoch seconds), else the time it was logged
+    def formatTime(self, record, datefmt=None):
+        event_ts = getattr(record, "event_ts", None)
+        if event_ts is None:
+            return super().formatTime(record, datefmt)
+        return datetime.datetime.fromtimestamp(event_ts).strftime(datefmt or LOG_DATE_FORMAT)
+
+class GzipRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # Rotates once the file reaches max_bytes; older segments are compressed
+    def __init__(self, filename, max_bytes, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.namer   = gzip_namer
+        self.rotator = gzip_rotator
+
+class GzipTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    # Rotates on a schedule (when='midnight', 'W0', ...); older segments are compressed
+    def __init__(self, filename, when, backup_count):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8')
+        self.namer   = gzip_namer
+        self.rotator = gzip_rotator
+
+
+def configure_logging(filename='pomodoro.csv', max_bytes=1024 * 1024, when=None, backup_count=100):
+    # Rotate by size, or by date when `when` (default: $POMODORO_LOG_ROTATE) is
+    # given. Callers only enqueue; writing, rotating and compressing happen on
+    # the listener thread.
+    global log_listener
+    if log_listener:
+        return
+
+    when = when or os.environ.get(LOG_ROTATE_ENV)
+    if when:
+        handler = GzipTimedRotatingFileHandler(filename, when, backup_count)
+    else:
+        handler = GzipRotatingFileHandler(filename, max_bytes, backup_count)
+    handler.setFormatter(EventFormatter(LOG_FORMAT, LOG_DATE_FORMAT))
+
+    log_queue    = queue.Queue()
+    log_listener = logging.handlers.QueueListener(log_queue, handler)
+    log_listener.start()
+    atexit.register(stop_logging)  # Drains the queue before exit
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+def stop_logging():
+    # Write out whatever is still queued; safe to call more than once
+    global log_listener
+    if log_listener:
+        log_listener.stop()
+        log_listener = None
+
+def log_event(status, activity, event_ts=None):
+    # event_ts: when the event happened, in epoch seconds (default: now)
+    logging.info(f"{status}, {activity if activity else NO_ACTIVITY}", extra={"event_ts": event_ts})
+
+
+# IMPORT
+def log_files(filename='pomodoro.csv'):
+    # The current log and its rotated segments
+    return [path for path in glob.glob(glob.escape(filename) + "*") if path == filename or path.endswith(".gz")]
+
+def read_log_events(path):
+    # Yield (epoch seconds, status, activity) for each well-formed line
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.rstrip('\r\n').split(', ', 2)
+            if len(parts) != 3 or parts[1] not in ("started", "cancelled", "finished"):
+                continue
+            try:
+                ts = int(datetime.datetime.strptime(parts[0], LOG_DATE_FORMAT).timestamp())
+            except ValueError:
+                continue
+            activity = "" if parts[2] == NO_ACTIVITY else parts[2]
+            yield ts, parts[1], activity
+
+def first_event_time(path):
+    for ts, _, _ in read_log_events(path):
+        return ts
+    return float('inf')
+
+def log_sessions(paths):
+    # Pair the events of all files into (activity, start_ts, end_ts, status)
+    # sessions, reading the files oldest first and one line at a time
+    open_sessions = {}  # activity -> start_ts
+    for path in sorted(paths, key=first_event_time):
+        for ts, status, activity in read_log_events(path):
+            if status == "started":
+                if activity in open_sessions:
+                    # Started again before it ended: the first one lost its end
+                    start_ts = open_sessions.pop(activity)
+                    yield activity, start_ts, start_ts, "missing"
+                open_sessions[activity] = ts
+            elif activity in open_sessions:
+                start_ts = open_sessions.pop(activity)
+                yield activity, start_ts, max(ts, start_ts), status
+
+    # Still open at the end of the log: the running session is already in the
+    # database and is skipped as a duplicate, anything else lost its end
+    for activity, start_ts in open_sessions.items():
+        yield activity, start_ts, start_ts, "missing"
+
+def import_logs(db, paths):
+    # Returns (sessions read, sessions inserted)
+    return db.import_sessions(log_sessions(paths))
@@ -0,0 +1,117 @@
+###########################################################################################
+#                                                                                         #
+# Performance metrics for the Pomodoro timer.                                             #
+#                                                                                         #
+# Off unless POMODORO_METRICS=1 is set or a front end calls enable() for its --metrics    #
+# flag. When off, nothing is wrapped and the few inline probes are a single flag test.    #
+# When on, instrument() wraps methods to record their latency, and timings and counts     #
+# collect in histograms that the debug panel shows and dump() writes as JSON:             #
+#                                                                                         #
+#   db.add_timer_log  db.commit  gui.wakeup  gui.update_suggestions  tick.jitter  ...     #
+#                                                                                         #
+###########################################################################################
+
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+ENABLED = os.environ.get("POMODORO_METRICS", "") not in ("", "0")
+
+BUCKETS = 32  # Bucket i holds latencies below 2**i microseconds
+
+histograms = {}  # name -> Histogram
+counters   = {}  # name -> count
+lock       = threading.Lock()
+
+
+class Histogram:
+    # Latencies in power-of-two microsecond buckets, with count, total and max
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count   = 0
+        self.total   = 0.0
+        self.max     = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1000000)
+        self.buckets[min(micros.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max    = max(self.max, seconds)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, in seconds
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** i / 1000000, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count":   self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms":  self.percentile(50) * 1000,
+            "p95_ms":  self.percentile(95) * 1000,
+            "p99_ms":  self.percentile(99) * 1000,
+            "max_ms":  self.max * 1000,
+            "buckets": {f"<{2 ** i}us": count for i, count in enumerate(self.buckets) if count},
+        }
+
+
+def enable():
+    # Call before instrument(); probes already skipped stay uncounted
+    global ENABLED
+    ENABLED = True
+
+def record(name, seconds):
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds)
+
+def count(name, n=1):
+    with lock:
+        counters[name] = counters.get(name, 0) + n
+
+def timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+def instrument(obj, prefix, names):
+    # Replace the named methods of obj with timed ones, recorded as prefix.name.
+    # Does nothing while metrics are off, so callers can always call it.
+    if not ENABLED:
+        return
+    for name in names:
+        setattr(obj, name, timed(f"{prefix}.{name}", getattr(obj, name)))
+
+def snapshot():
+    with lock:
+        return {
+            "time":       time.strftime("%Y-%m-%d %H:%M:%S"),
+            "histograms": {name: histogram.as_dict() for name, histogram in sorted(histograms.items())},
+            "counters":   dict(sorted(counters.items())),
+        }
+
+def reset():
+    with lock:
+        histograms.clear()
+        counters.clear()
+
+def dump(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
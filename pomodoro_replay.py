@@ -0,0 +1,380 @@
+###########################################################################################
+#                                                                                         #
+# Replay of timer scripts in virtual time, to test the timers without waiting for them.   #
+#                                                                                         #
+# A script starts and stops timers, suspends the machine and restarts the program at      #
+# given seconds from its start. VirtualClock runs it through TimerScheduler and the       #
+# TimerDriver wake-up loop of the GUI, thousands of times faster than real time, then     #
+# checks the timer_logs rows, the daily totals, the reminders and ends seen and how late  #
+# they came:                                                                              #
+#                                                                                         #
+#   python pomodoro_replay.py script.json --repeat 1000                                   #
+#   python pomodoro_replay.py --from-log pomodoro.csv                                     #
+#   python pomodoro_replay.py --generate 500 --seed 7 --save generated.json               #
+#                                                                                         #
+# Script events, "at" in seconds of wall-clock time from "start":                         #
+#                                                                                         #
+#   {"at": 0,   "do": "start", "activity": "Write", "minutes": 25, "notify": 5}           #
+#   {"at": 0,   "do": "cycle", "activity": "Write", "minutes": 25, "rounds": 4}           #
+#   {"at": 600, "do": "stop", "activity": "Write"}      (no activity: every timer)        #
+#   {"at": 700, "do": "suspend", "seconds": 300}        (the machine sleeps)              #
+#   {"at": 900, "do": "restart", "down": 60}            (the program exits, comes back)   #
+#                                                                                         #
+# "expect" may hold "timer_logs" rows, "events" ([kind, activity, scheduled time]),       #
+# "daily_totals" ({day: seconds}) and "max_late_ms" (default 50). Reminders and ends due  #
+# while the machine slept or the program was away may come late, and are not counted.     #
+#                                                                                         #
+###########################################################################################
+
+
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import random
+import sys
+import time
+
+from pomodoro_engine import ActivityDatabase, TimerDriver, TimerScheduler
+from pomodoro_logs import log_sessions
+
+
+TIME_FORMAT         = "%Y-%m-%d %H:%M:%S"
+DEFAULT_MAX_LATE_MS = 50
+RESUME_SLACK        = 1.0  # After a resume, the next wake-up can be up to a tick away
+IDLE_LIMIT          = 7 * 24 * 3600  # Longest a script may run on after its last event
+
+
+def parse_time(time_str):
+    return datetime.datetime.strptime(time_str, TIME_FORMAT).timestamp()
+
+def format_time(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime(TIME_FORMAT)
+
+
+class VirtualClock:
+    # SystemClock in virtual time, with Tk's after() and after_cancel(). Time
+    # only moves in advance() and suspend(); callbacks run in due order, each
+    # at its due time.
+    def __init__(self, start_ts):
+        self.wall      = float(start_ts)
+        self.mono      = 0.0
+        self.callbacks = []  # Heap of (monotonic due time, id, callback, args)
+        self.cancelled = set()
+        self.ids       = itertools.count(1)
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.wall)
+
+    def time(self):
+        return self.wall
+
+    def monotonic(self):
+        return self.mono
+
+    def after(self, ms, callback, *args):
+        after_id = next(self.ids)
+        heapq.heappush(self.callbacks, (self.mono + ms / 1000, after_id, callback, args))
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.cancelled.add(after_id)
+
+    def advance(self, seconds):
+        # Run the callbacks due within the next seconds
+        target = self.mono + seconds
+        while self.callbacks and self.callbacks[0][0] <= target:
+            due, after_id, callback, args = heapq.heappop(self.callbacks)
+            if after_id in self.cancelled:
+                self.cancelled.discard(after_id)
+                continue
+            self.move(due)
+            callback(*args)
+        self.move(target)
+
+    def run(self, limit):
+        # Run callbacks until none is left, or for at most limit seconds
+        end = self.mono + limit
+        while self.callbacks and self.callbacks[0][0] <= end:
+            self.advance(max(self.callbacks[0][0] - self.mono, 0))
+
+    def move(self, mono):
+        if mono > self.mono:
+            self.wall += mono - self.mono
+            self.mono  = mono
+
+    def suspend(self, seconds):
+        # The machine sleeps: the wall clock moves on, the monotonic clock
+        # stands still (as on Linux and macOS) and no callback runs
+        self.wall += seconds
+
+    def clear(self):
+        # The program exits: its pending callbacks go with it
+        self.callbacks = []
+        self.cancelled = set()
+
+
+class Replay:
+    # One run of a script, on a fresh in-memory database
+    def __init__(self, script):
+        self.script   = script
+        self.start_ts = parse_time(script["start"])
+        self.clock    = VirtualClock(self.start_ts)
+        self.db       = ActivityDatabase(":memory:")
+        self.observed = []  # [kind, activity, scheduled time, lateness in ms, excused]
+        self.excused  = []  # (from, to) wall-clock spans in which events may come late
+        self.launch()
+
+    def launch(self):
+        # Program start, as in PomodoroTimer.__init__
+        self.scheduler = TimerScheduler(self.db, self.clock)
+        self.scheduler.on_notify = lambda engine: self.observe("notify", engine, engine.ends_at.timestamp() - engine.notify_time)
+        self.scheduler.on_finish = lambda engine: self.observe("finish", engine, engine.ends_at.timestamp())
+        self.driver = TimerDriver(self.scheduler, self.clock.after, self.clock.after_cancel)
+        resumed     = self.scheduler.restore()
+        self.db.check_and_fix_records()
+        if resumed:
+            self.driver.focus(resumed[0])
+            self.driver.wakeup()
+
+    def observe(self, kind, engine, due_ts):
+        late_ms = (self.clock.time() - due_ts) * 1000
+        excused = any(start <= due_ts <= end for start, end in self.excused)
+        self.observed.append([kind, engine.activity, format_time(due_ts), late_ms, excused])
+
+    def run(self):
+        # Events in order of time; those at the same second in script order
+        for event in sorted(self.script["events"], key=lambda event: event["at"]):
+            self.clock.advance(max(self.start_ts + event["at"] - self.clock.time(), 0))
+            getattr(self, "do_" + event["do"])(event)
+        self.clock.run(IDLE_LIMIT)
+        return self.results()
+
+    def do_start(self, event):
+        # Started timers go on show, as in PomodoroTimer.start_timer()
+        duration = event.get("seconds", event.get("minutes", 25) * 60)
+        self.driver.focus(self.scheduler.start(event.get("activity", ""), duration, event.get("notify", 0) * 60))
+        self.driver.wakeup()
+
+    def do_cycle(self, event):
+        self.driver.focus(self.scheduler.start_cycle(
+            event.get("activity", ""), event.get("minutes", 25) * 60, event.get("short_break", 5) * 60,
+            event.get("long_break", 15) * 60, event.get("rounds", 4), event.get("notify", 0) * 60
+        ))
+        self.driver.wakeup()
+
+    def do_stop(self, event):
+        if "activity" in event:
+            engines = [engine for engine in [self.scheduler.find(event["activity"])] if engine]
+        else:
+            engines = self.scheduler.running
+        for engine in engines:
+            engine.stop()
+        self.driver.wakeup()
+
+    def do_suspend(self, event):
+        now = self.clock.time()
+        self.excused.append((now, now + event["seconds"] + RESUME_SLACK))
+        self.clock.suspend(event["seconds"])
+
+    def do_restart(self, event):
+        now  = self.clock.time()
+        down = event.get("down", 0)
+        self.excused.append((now, now + down))
+        self.clock.clear()
+        self.clock.advance(down)
+        self.launch()
+
+    def results(self):
+        counted = [event[3] for event in self.observed if not event[4]]
+        return {
+            "timer_logs":   [list(row) for row in self.db.conn.execute(
+                'SELECT activity_name, start_time, end_time, status FROM timer_logs ORDER BY date_time, id'
+            )],
+            "events":       [event[:3] for event in self.observed],
+            "daily_totals": dict(self.db.conn.execute('SELECT day, SUM(seconds) FROM daily_totals GROUP BY day ORDER BY day')),
+            "max_late_ms":  max(counted, default=0.0),
+        }
+
+def check(script, results):
+    # Differences between a script's expectations and the results of a run
+    expect   = script.get("expect", {})
+    failures = []
+    for key in ("timer_logs", "events"):
+        if key in expect and expect[key] != results[key]:
+            index = next((i for i, (a, b) in enumerate(zip(expect[key], results[key])) if a != b), None)
+            if index is None:
+                failures.append(f"{key}: expected {len(expect[key])} rows, got {len(results[key])}")
+            else:
+                failures.append(f"{key}[{index}]: expected {expect[key][index]}, got {results[key][index]}")
+    if "daily_totals" in expect and expect["daily_totals"] != results["daily_totals"]:
+        days = sorted(set(expect["daily_totals"]) | set(results["daily_totals"]))
+        diff = [f"{day} {expect['daily_totals'].get(day)} != {results['daily_totals'].get(day)}" for day in days
+                if expect["daily_totals"].get(day) != results["daily_totals"].get(day)]
+        failures.append("daily_totals: " + ", ".join(diff[:5]))
+    max_late_ms = expect.get("max_late_ms", DEFAULT_MAX_LATE_MS)
+    if results["max_late_ms"] > max_late_ms:
+        failures.append(f"timing: an event came {results['max_late_ms']:.1f} ms late, more than {max_late_ms} ms")
+    return failures
+
+
+# SCRIPTS
+def expected_rows(sessions):
+    # timer_logs rows and daily totals of (activity, start_ts, end_ts, status)
+    # sessions, in the order the view returns them
+    rows   = []
+    totals = {}
+    for session_id, (activity, start_ts, end_ts, status) in enumerate(sessions):
+        rows.append((format_time(start_ts), session_id * 2, [activity, format_time(start_ts), None, "started"]))
+        rows.append((format_time(end_ts), session_id * 2 + 1, [activity, None, format_time(end_ts), status]))
+        start = datetime.datetime.fromtimestamp(start_ts)
+        end   = datetime.datetime.fromtimestamp(end_ts)
+        while True:
+            midnight = datetime.datetime.combine(start.date() + datetime.timedelta(days=1), datetime.time.min)
+            piece    = min(end, midnight)
+            day      = start.date().isoformat()
+            totals[day] = totals.get(day, 0) + int((piece - start).total_seconds())
+            if end <= midnight:
+                break
+            start = midnight
+    rows.sort(key=lambda row: row[:2])
+    return [row[2] for row in rows], dict(sorted(totals.items()))
+
+def script_from_log(paths):
+    # Replay the sessions of event logs: finished ones run their full length,
+    # cancelled ones are stopped when they were. Sessions that lost their end
+    # are left out.
+    sessions = sorted((session for session in log_sessions(paths) if session[3] != "missing"), key=lambda session: session[1])
+    if not sessions:
+        raise ValueError("No complete sessions in the logs")
+    start_ts = sessions[0][1]
+    events   = []
+    for activity, session_start, session_end, status in sessions:
+        length = session_end - session_start
+        if status == "finished":
+            events.append((session_start, 1, {"at": session_start - start_ts, "do": "start", "activity": activity, "seconds": length}))
+        else:
+            # The planned length is not logged; any longer one is stopped in time
+            events.append((session_start, 1, {"at": session_start - start_ts, "do": "start", "activity": activity, "seconds": length + 3600}))
+            events.append((session_end, 0, {"at": session_end - start_ts, "do": "stop", "activity": activity}))
+    events.sort(key=lambda event: event[:2])  # A stop before a start at the same second
+
+    timer_logs, daily_totals = expected_rows(sessions)
+    return {
+        "start":  format_time(start_ts),
+        "events": [event for _, _, event in events],
+        "expect": {
+            "timer_logs":   timer_logs,
+            "events":       [["finish", activity, format_time(end_ts)] for activity, _, end_ts, status in sessions if status == "finished"],
+            "daily_totals": daily_totals,
+        },
+    }
+
+def generate_script(sessions, seed=None):
+    # Random one-at-a-time sessions with reminders, and for some of them a
+    # stop, a suspend or a restart. Some start late in the evening and run
+    # past midnight. Expectations come from a model of the rules, not from
+    # the engine.
+    rng      = random.Random(seed)
+    start_ts = parse_time("2024-03-01 09:00:00")
+    now      = start_ts
+    events   = []
+    logged   = []
+    expected = []
+    for i in range(sessions):
+        if rng.random() < 0.15:
+            # Skip to a late evening start, so the session crosses midnight
+            evening = datetime.datetime.fromtimestamp(now).replace(hour=23, minute=rng.randint(30, 55), second=0)
+            now     = max(now, evening.timestamp())
+        activity = f"Task {rng.randint(1, 8)}"
+        duration = rng.randint(5, 50) * 60
+        notify   = rng.choice((0, 0, 1, 2, 3))
+        end_ts   = now + duration
+        notify_ts = end_ts - notify * 60 if notify else None
+        events.append({"at": now - start_ts, "do": "start", "activity": activity, "minutes": duration // 60, "notify": notify})
+
+        incident = rng.choice((None, None, "stop", "suspend", "restart"))
+        offset   = rng.randint(10, duration - 10)
+        status   = "finished"
+        if incident == "stop":
+            end_ts = now + offset
+            status = "cancelled"
+            events.append({"at": offset + now - start_ts, "do": "stop", "activity": activity})
+            if notify_ts is not None and notify_ts >= end_ts:
+                notify_ts = None
+        elif incident == "suspend":
+            events.append({"at": offset + now - start_ts, "do": "suspend", "seconds": rng.randint(30, 3600)})
+        elif incident == "restart":
+            down = rng.randint(5, 1800)
+            events.append({"at": offset + now - start_ts, "do": "restart", "down": down})
+            # A reminder due while the program was away is dropped on restore
+            if notify_ts is not None and now + offset <= notify_ts <= now + offset + down:
+                notify_ts = None
+
+        logged.append((activity, now, end_ts, status))
+        if notify_ts is not None:
+            expected.append(["notify", activity, format_time(notify_ts)])
+        if status == "finished":
+            expected.append(["finish", activity, format_time(end_ts)])
+
+        # Leave room for a suspend or restart to end before the next session
+        now = max(end_ts, now + offset + 3600 if incident in ("suspend", "restart") else end_ts) + rng.randint(1, 120) * 60
+
+    timer_logs, daily_totals = expected_rows(logged)
+    return {
+        "start":  format_time(start_ts),
+        "events": events,
+        "expect": {"timer_logs": timer_logs, "events": expected, "daily_totals": daily_totals},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pomodoro_replay.py", description="Run timer scripts in virtual time and check the results")
+    parser.add_argument("scripts", nargs="*", help="script files (JSON)")
+    parser.add_argument("--from-log", action="append", metavar="FILE", help="replay the sessions of an event log, plain or .gz (repeatable)")
+    parser.add_argument("--generate", type=int, metavar="SESSIONS", help="replay a random script of this many sessions")
+    parser.add_argument("--seed", type=int, help="seed for --generate")
+    parser.add_argument("--repeat", type=int, default=1, help="run each script this many times (default: 1)")
+    parser.add_argument("--save", metavar="FILE", help="write the recorded or generated script, with its expectations, to FILE")
+    args = parser.parse_args(argv)
+
+    scripts = []
+    for path in args.scripts:
+        with open(path, encoding="utf-8") as f:
+            scripts.append((path, json.load(f)))
+    if args.from_log:
+        scripts.append(("log", script_from_log(args.from_log)))
+    if args.generate:
+        scripts.append((f"generated (seed {args.seed})", generate_script(args.generate, args.seed)))
+    if not scripts:
+        parser.error("give script files, --from-log or --generate")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(scripts[-1][1], f, indent=1, ensure_ascii=False)
+
+    failed = 0
+    for name, script in scripts:
+        started  = time.perf_counter()
+        failures = []
+        for run in range(1, args.repeat + 1):
+            replay   = Replay(script)
+            results  = replay.run()
+            failures = check(script, results)
+            if failures:
+                break
+        elapsed = time.perf_counter() - started
+        virtual = (replay.clock.time() - replay.start_ts) * run
+        if failures:
+            failed += 1
+            print(f"FAIL {name} (run {run})")
+            for failure in failures:
+                print(f"  {failure}")
+        else:
+            print(f"ok   {name}: {args.repeat} x {len(results['timer_logs']) // 2} sessions, "
+                  f"{virtual / 3600:.0f} h in {elapsed:.2f} s ({virtual / elapsed:,.0f}x real time), "
+                  f"latest event {results['max_late_ms']:.1f} ms late")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
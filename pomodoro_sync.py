@@ -0,0 +1,239 @@
+###########################################################################################
+#                                                                                         #
+# Sync between the databases of several devices.                                          #
+#                                                                                         #
+# Every device publishes numbered changesets through a transport, and applies the ones    #
+# of the other devices it has not seen yet:                                               #
+#                                                                                         #
+#   <shared directory or server>/<device uuid>/<sequence>.json                            #
+#                                                                                         #
+# A changeset holds the activities and closed sessions recorded on the device since its   #
+# previous one, found with high-water marks on activities.id and sessions.id. Applying    #
+# one twice changes nothing: activities merge by name, and a session is skipped when the  #
+# same activity already has one starting at the same time.                                #
+#                                                                                         #
+###########################################################################################
+
+
+import http.server
+import json
+import os
+import re
+import urllib.request
+import uuid
+
+from pomodoro_engine import SESSION_STATUSES
+
+
+CHANGESET_FORMAT = 1
+DEVICE_RE        = re.compile(r"[0-9a-f]{32}")
+CHANGESET_RE     = re.compile(r"([0-9]{10})\.json")
+
+
+# TRANSPORTS
+# A transport stores changesets by (device, sequence) and lists what it has
+class DirectoryTransport:
+    # Changesets as files in a directory every device can reach (network
+    # share, synced folder). Files are renamed into place once written.
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, device, sequence):
+        return os.path.join(self.root, device, f"{sequence:010d}.json")
+
+    def list(self):
+        # {device: [sequence, ...]}
+        changesets = {}
+        if not os.path.isdir(self.root):
+            return changesets
+        for device in os.listdir(self.root):
+            if DEVICE_RE.fullmatch(device):
+                names = os.listdir(os.path.join(self.root, device))
+                changesets[device] = [int(match[1]) for match in map(CHANGESET_RE.fullmatch, names) if match]
+        return changesets
+
+    def get(self, device, sequence):
+        with open(self.path(device, sequence), 'rb') as f:
+            return f.read()
+
+    def put(self, device, sequence, data):
+        path = self.path(device, sequence)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".part", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+
+class HttpTransport:
+    # Changesets on a SyncServer
+    def __init__(self, url, timeout=10):
+        self.url     = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, path, data=None):
+        request = urllib.request.Request(self.url + path, data=data, method="GET" if data is None else "PUT")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def list(self):
+        return json.loads(self.request("/"))
+
+    def get(self, device, sequence):
+        return self.request(f"/{device}/{sequence}")
+
+    def put(self, device, sequence, data):
+        self.request(f"/{device}/{sequence}", data)
+
+
+# SERVER
+class SyncRequestHandler(http.server.BaseHTTPRequestHandler):
+    # GET / lists the changesets, GET and PUT /<device>/<sequence> read and store one
+    def do_GET(self):
+        if self.path == "/":
+            self.reply(json.dumps(self.server.store.list()).encode())
+            return
+
+        key = self.changeset_key()
+        if key:
+            try:
+                self.reply(self.server.store.get(*key))
+            except FileNotFoundError:
+                self.send_error(404)
+
+    def do_PUT(self):
+        key = self.changeset_key()
+        if key:
+            length = int(self.headers.get("Content-Length", 0))
+            self.server.store.put(*key, self.rfile.read(length))
+            self.reply(b"")
+
+    def changeset_key(self):
+        match = re.fullmatch(r"/([0-9a-f]{32})/([0-9]{1,10})", self.path)
+        if not match:
+            self.send_error(404)
+            return None
+        return match[1], int(match[2])
+
+    def reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class SyncServer(http.server.ThreadingHTTPServer):
+    # A small stand-in for a sync service: keeps the changesets in a directory
+    def __init__(self, root, host="127.0.0.1", port=8765):
+        super().__init__((host, port), SyncRequestHandler)
+        self.store = DirectoryTransport(root)
+
+
+# SYNC
+def device_uuid(db):
+    device = db.get_meta('device_uuid')
+    if not device:
+        device = uuid.uuid4().hex
+        db.set_meta('device_uuid', device)
+        db.flush()
+    return device
+
+def running_session_id(db):
+    # The oldest session of the running timers
+    ids = [
+        db.conn.execute('''
+            SELECT MIN(sessions.id)
+            FROM sessions
+            JOIN activities ON activities.id = sessions.activity_id
+            WHERE sessions.start_ts = ? AND activities.name = ? AND sessions.end_ts IS NULL
+        ''', (state["started_ts"], state["activity"])).fetchone()[0]
+        for state in db.active_sessions().values()
+    ]
+    return min((i for i in ids if i is not None), default=None)
+
+def build_changeset(db):
+    # (changeset or None, meta values to store once it is published). Running
+    # sessions hold back the mark, so they are sent once they have ended.
+    # Other open sessions lost their end; they are not sent.
+    sent_session  = int(db.get_meta('sync_sent_session', '0'))
+    sent_activity = int(db.get_meta('sync_sent_activity', '0'))
+    sequence      = int(db.get_meta('sync_sequence', '0'))
+
+    running      = running_session_id(db)
+    last_session = db.conn.execute('SELECT MAX(id) FROM sessions WHERE id < ?', (running or 2**63 - 1,)).fetchone()[0] or 0
+    last_session = max(last_session, sent_session)
+    sessions = db.conn.execute('''
+        SELECT activities.name, sessions.start_ts, sessions.end_ts, sessions.status
+        FROM sessions
+        JOIN activities ON activities.id = sessions.activity_id
+        WHERE sessions.id > ? AND sessions.id <= ? AND sessions.device_id IS NULL AND sessions.end_ts IS NOT NULL
+        ORDER BY sessions.id
+    ''', (sent_session, last_session)).fetchall()
+    activities = db.conn.execute('SELECT id, name FROM activities WHERE id > ? ORDER BY id', (sent_activity,)).fetchall()
+    last_activity = activities[-1][0] if activities else sent_activity
+
+    marks = {'sync_sent_session': last_session, 'sync_sent_activity': last_activity}
+    if not sessions and not activities:
+        return None, marks
+
+    marks['sync_sequence'] = sequence + 1
+    changeset = {
+        "format":     CHANGESET_FORMAT,
+        "sequence":   sequence + 1,
+        "activities": [name for _, name in activities],
+        "sessions":   [[name, start_ts, end_ts, SESSION_STATUSES[status]] for name, start_ts, end_ts, status in sessions],
+    }
+    return changeset, marks
+
+def push(db, transport):
+    # Publish the local changes; returns the number of sessions sent
+    db.flush()
+    device           = device_uuid(db)
+    changeset, marks = build_changeset(db)
+    if changeset:
+        data = json.dumps(changeset, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        transport.put(device, changeset["sequence"], data)
+    for key, value in marks.items():
+        db.set_meta(key, str(value))
+    db.flush()
+    return len(changeset["sessions"]) if changeset else 0
+
+def apply_changeset(db, device, data):
+    # Merge one changeset of another device; returns the sessions inserted
+    changeset = json.loads(data)
+    if changeset.get("format") != CHANGESET_FORMAT:
+        raise ValueError(f"Unsupported changeset format {changeset.get('format')} from device {device}")
+
+    with db.conn:
+        db.conn.execute('INSERT OR IGNORE INTO devices (uuid) VALUES (?)', (device,))
+        device_id = db.conn.execute('SELECT id FROM devices WHERE uuid = ?', (device,)).fetchone()[0]
+        # Names are unique: an activity known under the same name here is the same activity
+        db.conn.executemany('INSERT OR IGNORE INTO activities (name) VALUES (?)', ((name,) for name in changeset["activities"]))
+    for name in changeset["activities"]:
+        if name:
+            db.activity_index.add(name)
+
+    _, inserted = db.import_sessions(map(tuple, changeset["sessions"]), device_id=device_id)
+
+    with db.conn:
+        db.conn.execute('UPDATE devices SET last_sequence = ? WHERE id = ?', (changeset["sequence"], device_id))
+    return inserted
+
+def pull(db, transport):
+    # Apply the changesets of other devices not seen yet, in order and without
+    # gaps; returns the number of sessions inserted
+    db.flush()
+    own      = device_uuid(db)
+    marks    = dict(db.conn.execute('SELECT uuid, last_sequence FROM devices').fetchall())
+    received = 0
+    for device, sequences in transport.list().items():
+        if device == own:
+            continue
+        available = set(sequences)
+        sequence  = marks.get(device, 0) + 1
+        while sequence in available:
+            received += apply_changeset(db, device, transport.get(device, sequence))
+            sequence += 1
+    return received
+
+def sync(db, transport):
+    # Returns (sessions sent, sessions received)
+    return push(db, transport), pull(db, transport)
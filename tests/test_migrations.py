@@ -0,0 +1,98 @@
+###########################################################################################
+#                                                                                         #
+# Upgrade of a database in the original format: timer_logs event rows with text times,   #
+# user_version 0.                                                                         #
+#                                                                                         #
+###########################################################################################
+
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pomodoro_engine import ActivityDatabase, MIGRATIONS
+
+
+def baseline_db(path, rows):
+    # The schema and rows as the first version of pomodoro.py wrote them
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE activities (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)')
+    conn.execute('''
+        CREATE TABLE timer_logs (
+            id INTEGER PRIMARY KEY,
+            activity_name TEXT NOT NULL,
+            start_time TEXT NULL,
+            end_time TEXT,
+            status TEXT NOT NULL,
+            date_time TEXT NOT NULL
+        )
+    ''')
+    for activity_name, start_time, end_time, status in rows:
+        conn.execute('INSERT OR IGNORE INTO activities (name) VALUES (?)', (activity_name,))
+        conn.execute(
+            'INSERT INTO timer_logs (activity_name, start_time, end_time, status, date_time) VALUES (?, ?, ?, ?, ?)',
+            (activity_name, start_time, end_time, status, start_time or end_time)
+        )
+    conn.commit()
+    conn.close()
+
+
+class BaselineMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp  = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "activities.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def migrate(self, rows):
+        baseline_db(self.path, rows)
+        db = ActivityDatabase(self.path)
+        self.addCleanup(db.close)
+        self.assertEqual(db.conn.execute('PRAGMA user_version').fetchone()[0], len(MIGRATIONS))
+        return db
+
+    def sessions(self, db):
+        return db.conn.execute('''
+            SELECT activities.name, sessions.end_ts - sessions.start_ts, sessions.status
+            FROM sessions JOIN activities ON activities.id = sessions.activity_id
+            ORDER BY sessions.id
+        ''').fetchall()
+
+    def test_paired_sessions(self):
+        db = self.migrate([
+            ("Write", "2024-05-01 09:00:00", None, "started"),
+            ("Write", None, "2024-05-01 09:25:00", "finished"),
+            ("Read",  "2024-05-01 10:00:00", None, "started"),
+            ("Read",  None, "2024-05-01 10:10:00", "cancelled"),
+        ])
+        self.assertEqual(self.sessions(db), [("Write", 1500, 1), ("Read", 600, 2)])
+        self.assertEqual(db.conn.execute('SELECT COUNT(*) FROM timer_logs_unmatched').fetchone()[0], 0)
+
+    def test_end_under_another_name_closes_the_open_session(self):
+        # The activity entry was edited while the timer ran
+        db = self.migrate([
+            ("Write",        "2024-05-01 09:00:00", None, "started"),
+            ("Write report", None, "2024-05-01 09:25:00", "finished"),
+        ])
+        self.assertEqual(self.sessions(db), [("Write", 1500, 1)])
+
+    def test_stray_end_is_kept(self):
+        db = self.migrate([
+            ("Write", None, "2024-05-01 08:00:00", "cancelled"),
+            ("Write", "2024-05-01 09:00:00", None, "started"),
+            ("Write", None, "2024-05-01 09:25:00", "finished"),
+        ])
+        self.assertEqual(self.sessions(db), [("Write", 1500, 1)])
+        self.assertEqual(
+            db.conn.execute('SELECT activity_name, end_time, status FROM timer_logs_unmatched').fetchall(),
+            [("Write", "2024-05-01 08:00:00", "cancelled")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
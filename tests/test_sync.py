@@ -0,0 +1,58 @@
+###########################################################################################
+#                                                                                         #
+# Sync after archiving: sessions recorded after the newest ones were archived still get   #
+# sent.                                                                                   #
+#                                                                                         #
+###########################################################################################
+
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pomodoro_engine import ActivityDatabase
+from pomodoro_sync import DirectoryTransport, sync
+
+
+DAY = 86400
+
+
+def add_session(db, activity, start_ts, seconds):
+    db.add_timer_log(activity, start_ts, None, "started")
+    db.add_timer_log(activity, start_ts, start_ts + seconds, "finished")
+
+
+class SyncAfterArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp       = tempfile.TemporaryDirectory()
+        self.transport = DirectoryTransport(os.path.join(self.tmp.name, "share"))
+        self.laptop    = ActivityDatabase(os.path.join(self.tmp.name, "laptop.db"))
+        self.desktop   = ActivityDatabase(os.path.join(self.tmp.name, "desktop.db"))
+
+    def tearDown(self):
+        self.laptop.close()
+        self.desktop.close()
+        self.tmp.cleanup()
+
+    def test_new_session_after_archiving_everything_is_sent(self):
+        old = int(time.time()) - 400 * DAY
+        for i in range(3):
+            add_session(self.laptop, "Write", old + i * 3600, 1500)
+        self.assertEqual(sync(self.laptop, self.transport), (3, 0))
+        self.assertEqual(self.laptop.archive_sessions(30), 3)
+        self.assertEqual(self.laptop.conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0], 0)
+
+        add_session(self.laptop, "Write", int(time.time()) - 3600, 1500)
+        new_id = self.laptop.conn.execute('SELECT MAX(id) FROM sessions').fetchone()[0]
+        self.assertGreater(new_id, 3)
+        self.assertEqual(sync(self.laptop, self.transport), (1, 0))
+
+        self.assertEqual(sync(self.desktop, self.transport), (0, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()